@@ -0,0 +1,154 @@
+# In 005_AboutOpenFunction.py, every read path either loads the whole file at once
+# (read(), readlines()) or uses a very small buffer (buffering=3).
+# That is fine for a 300 byte example, but not for flat files of several GB.
+# In this file, I will build a small streaming reader on top of get_path.
+# The idea is simple.
+# Never hold the whole file, hold only one chunk at a time and hand it over through a generator.
+# Then memory use stays flat no matter how big the file is.
+
+import codecs
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+# ====================================================================================================
+
+# Choosing the buffer size
+# io.DEFAULT_BUFFER_SIZE is usually 8192 bytes.
+# It is a good value for small files, but for large files, too many read calls are made.
+# On the other hand, a huge buffer wastes memory for small files.
+# So the buffer grows with the file size,
+# but it is always a multiple of io.DEFAULT_BUFFER_SIZE and never exceeds MAX_CHUNK_SIZE.
+MAX_CHUNK_SIZE = 1024 * 1024
+CHUNKS_PER_FILE = 64
+
+def choose_buffer_size(file_size):
+    size = max(io.DEFAULT_BUFFER_SIZE, min(MAX_CHUNK_SIZE, file_size // CHUNKS_PER_FILE))
+    return size - size % io.DEFAULT_BUFFER_SIZE
+
+print(f"Default buffer size : {io.DEFAULT_BUFFER_SIZE}")
+for file_size in (300, 10 * 1024 * 1024, 5 * 1024 * 1024 * 1024):
+    print(f"file size : {file_size:>12} -> buffer size : {choose_buffer_size(file_size)}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Reading byte chunks
+# The file is opened with buffering=0 because we already read in large blocks.
+# A second buffer in between would only copy the same bytes once more.
+# readinto() fills one bytearray that is reused, so no new buffer is created per read.
+# Only the bytes handed over to the caller are copied.
+def read_chunks(path, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = choose_buffer_size(os.path.getsize(path))
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, mode="rb", buffering=0) as f:
+        while True:
+            read_size = f.readinto(buffer)
+            if not read_size:
+                break
+            yield bytes(view[:read_size])
+
+# Reading decoded lines
+# When decoding chunks, a multibyte character can be cut in half at the end of a chunk.
+# The incremental decoder keeps the incomplete bytes and finishes them with the next chunk.
+# IncrementalNewlineDecoder does the same job as newline=None in open(),
+# so \r\n and \r are translated into \n even if they are split between two chunks.
+# The last line of a chunk may be incomplete, so it is kept until the next chunk arrives.
+# The pieces of an incomplete line are collected in a list and joined once, when its line break arrives.
+# Adding each piece to one string would copy the whole line again for every chunk,
+# which is very slow for a very long line or a file without line breaks.
+# Such a line still has to be held whole, because it is handed over as one string.
+def read_lines(path, encoding="utf-8", errors="strict", chunk_size=None):
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+    pieces = []
+    for chunk in read_chunks(path, chunk_size):
+        lines = decoder.decode(chunk).split("\n")
+        if len(lines) > 1:
+            pieces.append(lines[0])
+            yield "".join(pieces) + "\n"
+            for line in lines[1:-1]:
+                yield line + "\n"
+            pieces = []
+        if lines[-1]:
+            pieces.append(lines[-1])
+    pieces.append(decoder.decode(b"", final=True))
+    rest = "".join(pieces)
+    if rest:
+        yield rest
+
+# Since both are generators, they can be connected like a pipeline.
+# Each step takes one item at a time, so nothing is accumulated in the middle.
+text_data_path = get_path("datasets", "005_text.txt")
+for line in read_lines(text_data_path):
+    print(">>>", line, end="")
+
+print()
+non_empty_lines = (line for line in read_lines(text_data_path) if line.strip())
+word_counts = (len(line.split()) for line in non_empty_lines)
+print(f"Number of words : {sum(word_counts)}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Let's compare the throughput with read() and readlines() used in 005_AboutOpenFunction.py.
+# A synthetic flat file is created in the temporary directory,
+# and the peak memory is measured with tracemalloc.
+# tracemalloc slows down every allocation, so time and memory are measured in separate runs.
+# Increase BENCHMARK_FILE_SIZE to see the difference more clearly.
+BENCHMARK_FILE_SIZE = 32 * 1024 * 1024
+
+def make_flat_file(path, size):
+    with open(text_data_path, "r", encoding="utf-8") as f:
+        sample = f.read()
+    if not sample.endswith("\n"):
+        sample += "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(size // len(sample) + 1):
+            f.write(sample)
+
+def use_read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return len(f.read())
+
+def use_readlines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return len(f.readlines())
+
+def use_read_chunks(path):
+    return sum(len(chunk) for chunk in read_chunks(path))
+
+def use_read_lines(path):
+    return sum(1 for _ in read_lines(path))
+
+def benchmark(name, function, path):
+    start = time.perf_counter()
+    function(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"{name:<15} {size_mb / elapsed:>10.1f} MB/s {peak / (1024 * 1024):>10.2f} MB peak")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    flat_file_path = os.path.join(temp_dir, "007_flat_file.txt")
+    make_flat_file(flat_file_path, BENCHMARK_FILE_SIZE)
+    print(f"Benchmark file size : {os.path.getsize(flat_file_path)} bytes")
+    benchmark("read()", use_read, flat_file_path)
+    benchmark("readlines()", use_readlines, flat_file_path)
+    benchmark("read_chunks()", use_read_chunks, flat_file_path)
+    benchmark("read_lines()", use_read_lines, flat_file_path)
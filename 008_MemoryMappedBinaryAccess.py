@@ -0,0 +1,201 @@
+# In the binary section of 005_AboutOpenFunction.py, 005_binary_ex.bin is read with read()
+# and then walked byte by byte with "for byte in binary_data".
+# read() copies the whole file into memory, and the for statement runs Python code for every byte.
+# For a multi-GB binary log, neither is acceptable.
+# In this file, I will use mmap to access a binary file without copying it.
+
+# What is mmap?
+# mmap maps a file into the memory of the process.
+# The operating system reads only the pages that are actually touched,
+# so even a huge file can be treated like one big bytes object.
+# Combined with memoryview, a part of the file can be handed over without any copy.
+
+import mmap
+import os
+import tempfile
+import time
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+# ====================================================================================================
+
+# Binary accessor
+# seek() and tell() work like the ones in the seek_method_handle example.
+# whence 0, 1 and 2 mean the start of the file, the current position and the end of the file.
+# read() and slice() return a memoryview, so nothing is copied until bytes() is called on it.
+# Release every memoryview before close(), otherwise mmap cannot be closed.
+# find() and count() scan inside mmap in C code, not in a Python loop.
+# mmap has no count(), and a mm.find() call per match is about 16 times slower than bytes.count
+# on a file with many short records. So single bytes are counted in small slices of this size.
+# A slice is copied, but it stays in the CPU cache, so the copy is cheap and the memory use does not grow.
+COUNT_CHUNK_SIZE = 64 * 1024
+
+class BinaryMap:
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.position = 0
+        self._file = open(path, "rb")
+        # An empty file cannot be mapped, so an empty memoryview is used instead.
+        if self.size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        else:
+            self._map = None
+            self._view = memoryview(b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            position = offset
+        elif whence == 1:
+            position = self.position + offset
+        elif whence == 2:
+            position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence}, should be 0, 1 or 2)")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self.position = position
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        end = self.size if size < 0 else min(self.size, self.position + size)
+        data = self.slice(self.position, end)
+        self.position = max(self.position, end)
+        return data
+
+    def slice(self, start, end=None):
+        return self._view[start:end]
+
+    def find(self, delimiter, start=None, end=None):
+        if self._map is None:
+            return -1
+        start = self.position if start is None else start
+        end = self.size if end is None else end
+        return self._map.find(delimiter, start, end)
+
+    def count(self, delimiter, start=0, end=None):
+        if not delimiter:
+            raise ValueError("empty delimiter")
+        if self._map is None:
+            return 0
+        end = self.size if end is None else end
+        # A single byte can never be split between two slices,
+        # so the file is counted slice by slice with bytes.count.
+        if len(delimiter) == 1:
+            total = 0
+            for chunk_start in range(start, end, COUNT_CHUNK_SIZE):
+                chunk_end = min(end, chunk_start + COUNT_CHUNK_SIZE)
+                total += self._map[chunk_start:chunk_end].count(delimiter)
+            return total
+        # For longer delimiters, mmap.find jumps from one match to the next.
+        total = 0
+        position = self._map.find(delimiter, start, end)
+        while position != -1:
+            total += 1
+            position = self._map.find(delimiter, position + len(delimiter), end)
+        return total
+
+    def split(self, delimiter):
+        # An empty delimiter would be found at every position, so it is refused as bytes.split does.
+        # It is checked before the generator starts, so the error comes from the split() call itself.
+        if not delimiter:
+            raise ValueError("empty separator")
+        return self._split(delimiter)
+
+    def _split(self, delimiter):
+        # Each record is a memoryview into the mapping, not a copy.
+        start = 0
+        while start < self.size:
+            end = self.find(delimiter, start)
+            if end == -1:
+                yield self.slice(start)
+                return
+            yield self.slice(start, end)
+            start = end + len(delimiter)
+
+# ====================================================================================================
+
+# Let's use the same file as 005_AboutOpenFunction.py.
+text = "Hello Open Function"
+binary_file_path = get_path("datasets", "005_binary_ex.bin")
+with open(binary_file_path, mode="wb") as f:
+    f.write(text.encode("utf-8"))
+
+with BinaryMap(binary_file_path) as binary_map:
+    print(f"size : {len(binary_map)}")
+    data = binary_map.read(5)
+    print(f"read(5) : {bytes(data)}")
+    print("The current cursor position is:", binary_map.tell())
+    data.release()
+
+    binary_map.seek(-8, 2)
+    print("The current cursor position is:", binary_map.tell())
+    data = binary_map.read()
+    print(f"read() : {bytes(data)}")
+    data.release()
+
+    print(f"find(b'Open') : {binary_map.find(b'Open', 0)}")
+    print(f"count(b'n') : {binary_map.count(b'n')}")
+    for word in binary_map.split(b" "):
+        print(f">>> word : {word.tobytes().decode('utf-8')}")
+        word.release()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# A synthetic binary log is made of records separated by a zero byte.
+# The per-byte loop from 005_AboutOpenFunction.py is compared with BinaryMap.count.
+# Increase BENCHMARK_FILE_SIZE to see how the per-byte loop falls behind.
+BENCHMARK_FILE_SIZE = 16 * 1024 * 1024
+RECORD = b"2020-07-07 INFO binary log record" + b"\x00"
+
+def count_with_loop(path):
+    with open(path, "rb") as f:
+        binary_data = f.read()
+    total = 0
+    for byte in binary_data:
+        if byte == 0:
+            total += 1
+    return total
+
+def count_with_map(path):
+    with BinaryMap(path) as binary_map:
+        return binary_map.count(b"\x00")
+
+def benchmark(name, function, path):
+    start = time.perf_counter()
+    result = function(path)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"{name:<20} {result:>10} records {size_mb / elapsed:>10.1f} MB/s")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    binary_log_path = os.path.join(temp_dir, "008_binary_log.bin")
+    with open(binary_log_path, "wb") as f:
+        f.write(RECORD * (BENCHMARK_FILE_SIZE // len(RECORD)))
+    benchmark("for byte in data", count_with_loop, binary_log_path)
+    benchmark("BinaryMap.count", count_with_map, binary_log_path)
@@ -0,0 +1,234 @@
+# In 005_AboutOpenFunction.py, readline() and next() were introduced.
+# Both of them can reach the N-th line only by reading every line before it.
+# If a paging screen shows random lines of a huge flat file, every access becomes a linear scan.
+# In this file, I will make a line-offset index.
+# It is a compact array of the byte position where each line starts.
+# With it, seek() jumps straight to line N.
+
+# The index is stored next to the dataset with the ".idx" extension.
+# It is built only once, and the file size and modification time are saved together.
+# If the file was only appended to, like 005_append_ex.txt in 'a' mode,
+# only the new part is scanned and added to the index.
+# A file that grew is taken as appended only if its last bytes before the growth are unchanged.
+# If the file was changed in any other way, the index is built again.
+
+import itertools
+import os
+import random
+import struct
+import tempfile
+import time
+import zlib
+from array import array
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+# ====================================================================================================
+
+# Index file format
+# header : magic number, size of the dataset, modification time of the dataset (nanoseconds),
+#          CRC-32 of the last TAIL_SIZE bytes of the dataset
+# body : start offset of every line as unsigned 64-bit integers (array type code 'Q')
+# The first offset is always 0, and the position after every b"\n" is added.
+# If the file ends with a line break, the last offset is equal to the file size and is not a line.
+INDEX_MAGIC = b"LIX2"
+INDEX_HEADER = struct.Struct("<4sQQI")
+SCAN_CHUNK_SIZE = 1024 * 1024
+TAIL_SIZE = 4096
+
+def tail_checksum(path, size):
+    with open(path, "rb") as f:
+        start = max(0, size - TAIL_SIZE)
+        f.seek(start)
+        return zlib.crc32(f.read(size - start))
+
+def scan_line_starts(path, start, offsets):
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        while True:
+            chunk = f.read(SCAN_CHUNK_SIZE)
+            if not chunk:
+                break
+            found = chunk.find(b"\n")
+            while found != -1:
+                offsets.append(position + found + 1)
+                found = chunk.find(b"\n", found + 1)
+            position += len(chunk)
+    return offsets
+
+class LineIndex:
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or f"{path}.idx"
+        self.offsets = array("Q")
+        self.size = 0
+        self.mtime_ns = 0
+        self.tail_crc = 0
+        self.refresh()
+
+    def __len__(self):
+        if self.offsets[-1] < self.size:
+            return len(self.offsets)
+        return len(self.offsets) - 1
+
+    def refresh(self):
+        # Check the saved index against the current state of the file,
+        # and choose between using it as it is, updating it, and building it again.
+        stat = os.stat(self.path)
+        if not self.offsets and not self._load():
+            self._build(stat)
+        elif stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns:
+            return "fresh"
+        elif stat.st_size > self.size and tail_checksum(self.path, self.size) == self.tail_crc:
+            self._update(stat)
+            return "updated"
+        else:
+            self._build(stat)
+        return "built"
+
+    def _load(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, size, mtime_ns, tail_crc = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    return False
+                offsets = array("Q")
+                offsets.frombytes(f.read())
+        except (FileNotFoundError, struct.error, ValueError):
+            return False
+        if not offsets:
+            return False
+        self.offsets, self.size, self.mtime_ns, self.tail_crc = offsets, size, mtime_ns, tail_crc
+        return True
+
+    def _build(self, stat):
+        self.offsets = scan_line_starts(self.path, 0, array("Q", [0]))
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+        self.tail_crc = tail_checksum(self.path, self.size)
+        # Write to a temporary file first and replace it,
+        # so a broken index is never left behind if the program stops in the middle.
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.size, self.mtime_ns, self.tail_crc))
+            self.offsets.tofile(f)
+        os.replace(temp_path, self.index_path)
+
+    def _update(self, stat):
+        old_count = len(self.offsets)
+        scan_line_starts(self.path, self.size, self.offsets)
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+        self.tail_crc = tail_checksum(self.path, self.size)
+        # Only the new offsets are added at the end of the index file, and the header is rewritten.
+        with open(self.index_path, "r+b") as f:
+            f.seek(0, 2)
+            self.offsets[old_count:].tofile(f)
+            f.seek(0)
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.size, self.mtime_ns, self.tail_crc))
+
+    def append(self, lines, encoding="utf-8"):
+        with open(self.path, mode="a", encoding=encoding) as f:
+            f.writelines(lines)
+        return self.refresh()
+
+    def get_line(self, number, encoding="utf-8"):
+        if not 0 <= number < len(self):
+            raise IndexError(f"line {number} is out of range (0 ~ {len(self) - 1})")
+        start = self.offsets[number]
+        end = self.offsets[number + 1] if number + 1 < len(self.offsets) else self.size
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode(encoding)
+
+    def get_page(self, page, page_size, encoding="utf-8"):
+        # A page is read with one seek() and one read(), because its lines are next to each other.
+        # It is cut at the stored offsets, because splitlines() would also split at '\r' and other breaks.
+        first = page * page_size
+        last = min(len(self), first + page_size)
+        if first >= last:
+            return []
+        start = self.offsets[first]
+        end = self.offsets[last] if last < len(self.offsets) else self.size
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        bounds = [offset - start for offset in self.offsets[first:last]] + [end - start]
+        return [data[bounds[i]:bounds[i + 1]].decode(encoding) for i in range(last - first)]
+
+# ====================================================================================================
+
+# Let's try it with the append example of 005_AboutOpenFunction.py.
+# A copy is made in a temporary directory so that the datasets folder is not changed.
+sports = ["tennis, ", "soccer, ", "baseball\n"]
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    append_text_file_path = os.path.join(temp_dir, "005_append_ex.txt")
+    with open(append_text_file_path, mode="a", encoding="utf-8") as f:
+        for number in range(3):
+            f.writelines([f"{number} : "] + sports)
+
+    line_index = LineIndex(append_text_file_path)
+    print(f"Index file : {os.path.basename(line_index.index_path)}")
+    print(f"Number of lines : {len(line_index)}")
+    print(f"Line 2 : {line_index.get_line(2)!r}")
+
+    # Opening the index again loads the saved file without scanning the dataset.
+    print(f"Reopen : {LineIndex(append_text_file_path).refresh()}")
+
+    # Appending in 'a' mode only adds the new offsets.
+    print(f"Append : {line_index.append(['3 : '] + sports)}")
+    print(f"Number of lines : {len(line_index)}")
+    print(f"Line 3 : {line_index.get_line(3)!r}")
+
+    # Overwriting in 'w' mode makes the index stale, so it is built again.
+    with open(append_text_file_path, mode="w", encoding="utf-8") as f:
+        f.writelines(sports)
+    print(f"Overwrite : {line_index.refresh()}")
+    print(f"Page 0 : {line_index.get_page(0, 10)}")
+
+    # A file that was rewritten and then grew is not mistaken for an append.
+    with open(append_text_file_path, mode="w", encoding="utf-8", newline="") as f:
+        f.writelines(["tennis\r", "soccer, ", "baseball, ", "golf\n", "0 : tennis\n"])
+    print(f"Rewrite and grow : {line_index.refresh()}")
+    print(f"Page 0 : {line_index.get_page(0, 10)}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Random lines are read from a synthetic flat file.
+# The readline() way has to read every line before the target line,
+# while the index needs only one seek() and one read().
+BENCHMARK_LINE_COUNT = 200_000
+BENCHMARK_ACCESS_COUNT = 200
+
+def read_with_scan(path, number):
+    with open(path, "rb") as f:
+        return next(itertools.islice(f, number, None)).decode("utf-8")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    flat_file_path = os.path.join(temp_dir, "009_flat_file.txt")
+    with open(flat_file_path, "w", encoding="utf-8") as f:
+        for number in range(BENCHMARK_LINE_COUNT):
+            f.write(f"{number},user{number},user{number}@example.com\n")
+    targets = [random.randrange(BENCHMARK_LINE_COUNT) for _ in range(BENCHMARK_ACCESS_COUNT)]
+
+    start = time.perf_counter()
+    line_index = LineIndex(flat_file_path)
+    print(f"Index build : {time.perf_counter() - start:.3f} sec for {len(line_index)} lines")
+
+    start = time.perf_counter()
+    scanned = [read_with_scan(flat_file_path, number) for number in targets]
+    scan_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [line_index.get_line(number) for number in targets]
+    index_elapsed = time.perf_counter() - start
+
+    assert scanned == indexed
+    print(f"linear scan : {scan_elapsed / BENCHMARK_ACCESS_COUNT * 1000:>10.3f} ms per line")
+    print(f"line index  : {index_elapsed / BENCHMARK_ACCESS_COUNT * 1000:>10.3f} ms per line")
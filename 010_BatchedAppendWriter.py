@@ -0,0 +1,200 @@
+# In the append section of 005_AboutOpenFunction.py, 005_append_ex.txt is opened in 'a' mode
+# and writelines() is called once.
+# In a real service, log records come from many producers at the same time.
+# If every record opens the file, writes, and closes it again, a system call is made for every record,
+# and if durability is needed, an fsync is made for every record as well.
+# In this file, I will make an append writer that collects records in memory
+# and writes them at once when a size or time threshold is reached.
+
+# Group commit
+# fsync forces the data in the operating system buffer down to the disk, and it is very expensive.
+# If one fsync is done for a whole batch instead of for every record,
+# the cost of the fsync is shared by all records in the batch.
+# This is called group commit, and databases use the same trick.
+
+import os
+import tempfile
+import threading
+import time
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+# ====================================================================================================
+
+# Append writer
+# encoding and newline are passed to open() as they are,
+# so they work the same as in the write and newline sections of 005_AboutOpenFunction.py.
+# write() only adds the record to the list, and the actual writing is done by flush().
+# flush() is called when max_records or max_bytes is reached,
+# and a background thread calls it every flush_interval seconds so that records do not wait forever.
+# close() stops the background thread and writes every pending record before closing the file.
+# If the batch cannot be handed to the file object, it is put back in front of the pending records.
+# If only the flush or the fsync after it fails, the data is already in the file object or the OS,
+# so the next flush() tries the flush and fsync again instead of writing the batch twice.
+# A failure in the background thread is raised by the next write() or close().
+# max_bytes counts the encoded bytes of the records, not the characters.
+class AppendWriter:
+    def __init__(self, path, encoding="utf-8", errors=None, newline=None,
+                 max_records=1000, max_bytes=1024 * 1024, flush_interval=1.0, fsync=False):
+        self.path = path
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.flush_count = 0
+        self.record_count = 0
+        self._handle = open(path, mode="a", encoding=encoding, errors=errors, newline=newline)
+        self._encoding = self._handle.encoding
+        self._errors = self._handle.errors
+        self._pending = []
+        self._pending_size = 0
+        self._closed = False
+        self._error = None
+        self._unsynced = False
+        # _lock protects the pending list, and _io_lock keeps the batches in order in the file.
+        # Producers can keep adding records while the previous batch is being written.
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_error(self):
+        # The error of the background thread is raised only once.
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def write(self, record, end="\n"):
+        text = record + end
+        # An ASCII text has as many bytes as characters, so only other texts are encoded to be measured.
+        size = len(text) if text.isascii() else len(text.encode(self._encoding, self._errors))
+        with self._lock:
+            if self._closed:
+                raise ValueError("I/O operation on closed writer.")
+            self._raise_error()
+            self._pending.append(text)
+            self._pending_size += size
+            is_full = len(self._pending) >= self.max_records or self._pending_size >= self.max_bytes
+        if is_full:
+            self.flush()
+
+    def writelines(self, records, end="\n"):
+        for record in records:
+            self.write(record, end)
+
+    def flush(self):
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                batch_size, self._pending_size = self._pending_size, 0
+            if not batch and not self._unsynced:
+                return 0
+            try:
+                self._handle.write("".join(batch))
+            except BaseException:
+                with self._lock:
+                    self._pending[:0] = batch
+                    self._pending_size += batch_size
+                raise
+            self._unsynced = True
+            self._handle.flush()
+            if self.fsync:
+                os.fsync(self._handle.fileno())
+            self._unsynced = False
+            self.flush_count += 1
+            self.record_count += len(batch)
+            return len(batch)
+
+    def _flush_periodically(self):
+        while not self._wake_up.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # The thread keeps running and tries again, and the error is reported to the producers.
+                self._error = e
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake_up.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            self._handle.close()
+        self._raise_error()
+
+# ====================================================================================================
+
+# Let's write the sports list of 005_AboutOpenFunction.py from several producers.
+# A temporary file is used so that the datasets folder is not changed.
+sports = ["tennis", "soccer", "baseball"]
+
+def produce(writer, producer_id, count):
+    for number in range(count):
+        writer.write(f"producer {producer_id} : {number} : {', '.join(sports)}")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    append_text_file_path = os.path.join(temp_dir, "005_append_ex.txt")
+    with AppendWriter(append_text_file_path, max_records=50, flush_interval=0.1, fsync=True) as writer:
+        producers = [threading.Thread(target=produce, args=(writer, producer_id, 100)) for producer_id in range(4)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+    print(f"records : {writer.record_count}, flushes (fsync) : {writer.flush_count}")
+
+    with open(append_text_file_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    print(f"lines in file : {len(lines)}")
+    print(f"first line : {lines[0]!r}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The open-write-close pattern for every record is compared with AppendWriter at several batch sizes.
+# Both sides do an fsync for each write to the disk, so the difference is the number of fsync calls.
+BENCHMARK_RECORD_COUNT = 2000
+BENCHMARK_BATCH_SIZES = (1, 10, 100, 1000)
+
+def write_one_by_one(path, records):
+    for record in records:
+        with open(path, mode="a", encoding="utf-8") as f:
+            f.write(record + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+def write_with_writer(path, records, batch_size):
+    with AppendWriter(path, max_records=batch_size, flush_interval=None, fsync=True) as writer:
+        writer.writelines(records)
+
+def report(name, elapsed):
+    print(f"{name:<25} {BENCHMARK_RECORD_COUNT / elapsed:>12.0f} records/s")
+
+records = [f"{number},user{number}@example.com,{', '.join(sports)}" for number in range(BENCHMARK_RECORD_COUNT)]
+with tempfile.TemporaryDirectory() as temp_dir:
+    start = time.perf_counter()
+    write_one_by_one(os.path.join(temp_dir, "one_by_one.txt"), records)
+    report("open/write/close", time.perf_counter() - start)
+
+    for batch_size in BENCHMARK_BATCH_SIZES:
+        start = time.perf_counter()
+        write_with_writer(os.path.join(temp_dir, f"batch_{batch_size}.txt"), records, batch_size)
+        report(f"AppendWriter batch {batch_size}", time.perf_counter() - start)
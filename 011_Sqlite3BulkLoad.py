@@ -0,0 +1,174 @@
+# In 006_Sqlite3BasicUsage.py, users are inserted with separate cur.execute calls
+# and conn.commit() is called after every statement.
+# Only the small user_list tuple goes through executemany.
+# Every commit waits until the data is safely on the disk,
+# so loading millions of users this way spends most of the time waiting for the disk.
+# In this file, I will make a bulk loader for the same user table.
+
+# The bulk loader does four things.
+# First, rows are bundled into large transactions, so there are only a few commits.
+# Second, PRAGMAs that make loading faster are applied during the load and restored afterwards.
+# Third, indexes are dropped before the load and built again at the end,
+# because building an index once is much cheaper than updating it for every row.
+# Fourth, it reports rows per second, so it can be compared with the per-row commit pattern.
+
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from itertools import islice
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+# The same table as 006_Sqlite3BasicUsage.py.
+# An index on email is added to show how index builds are deferred.
+def create_user_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS user_email_idx ON user(email)
+    """)
+    conn.commit()
+
+# Any iterable or generator of (id, name, email, regdate) can be loaded.
+# A generator is used here so that millions of rows are never held in memory at once.
+def generate_users(count, start=1):
+    for pk in range(start, start + count):
+        name = f"user{pk}"
+        yield (pk, name, f"{name}@example.com", now)
+
+# ====================================================================================================
+
+# Load-time PRAGMAs
+# journal_mode=WAL : writes go to a separate log file, and readers are not blocked during the load.
+# synchronous=OFF : sqlite3 does not wait for the disk. If the power goes out during the load,
+#                   the database can be broken, so it is used only while loading.
+# cache_size : negative values are in KiB. A larger page cache means fewer reads from the disk.
+LOAD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "OFF",
+    "cache_size": -256 * 1024,
+}
+
+def bulk_load_users(conn, rows, batch_size=50_000, pragmas=LOAD_PRAGMAS):
+    cur = conn.cursor()
+    # Remember the current PRAGMA values to restore them at the end.
+    saved_pragmas = {name: cur.execute(f"PRAGMA {name}").fetchone()[0] for name in pragmas}
+    # Remember the secondary indexes of the user table and drop them.
+    # Automatic indexes (such as the ones for UNIQUE) have no sql and cannot be dropped.
+    cur.execute("""
+        SELECT name, sql
+        FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'user' AND sql IS NOT NULL
+    """)
+    indexes = cur.fetchall()
+
+    start = time.perf_counter()
+    total = 0
+    try:
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name} = {value}")
+        for name, _ in indexes:
+            cur.execute(f"DROP INDEX {name}")
+        conn.commit()
+
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            cur.executemany("""
+                INSERT INTO user (id, name, email, regdate)
+                VALUES (?, ?, ?, ?)
+            """, batch)
+            conn.commit()
+            total += len(batch)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # The indexes and PRAGMAs are restored even if the load fails.
+        for _, sql in indexes:
+            cur.execute(sql)
+        conn.commit()
+        for name, value in saved_pragmas.items():
+            cur.execute(f"PRAGMA {name} = {value}")
+    elapsed = time.perf_counter() - start
+    return total, elapsed
+
+# ====================================================================================================
+
+# Let's load users into a database in a temporary directory.
+# 006_database.db is not touched, because 006_Sqlite3BasicUsage.py drops and creates it every time.
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "011_database.db"))
+    create_user_table(conn)
+
+    total, elapsed = bulk_load_users(conn, generate_users(100_000))
+    print(f"Loaded {total} rows in {elapsed:.3f} sec ({total / elapsed:.0f} rows/s)")
+
+    cur = conn.cursor()
+    print(f"count : {cur.execute('SELECT count(*) FROM user').fetchone()[0]}")
+    print(f"journal_mode after load : {cur.execute('PRAGMA journal_mode').fetchone()[0]}")
+    print(f"synchronous after load : {cur.execute('PRAGMA synchronous').fetchone()[0]}")
+    cur.execute("""
+        SELECT name
+        FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'user'
+    """)
+    print(f"indexes after load : {[name for name, in cur.fetchall()]}")
+    conn.close()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The per-row commit pattern of 006_Sqlite3BasicUsage.py is slow,
+# so it is measured with fewer rows than the bulk loader.
+# rows/s can be compared directly even though the number of rows is different.
+PER_ROW_COUNT = 2_000
+BULK_COUNT = 1_000_000
+
+def load_with_per_row_commit(conn, rows):
+    cur = conn.cursor()
+    start = time.perf_counter()
+    total = 0
+    for row in rows:
+        cur.execute("""
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, row)
+        conn.commit()
+        total += 1
+    return total, time.perf_counter() - start
+
+def report(name, total, elapsed):
+    print(f"{name:<20} {total:>10} rows {elapsed:>10.3f} sec {total / elapsed:>12.0f} rows/s")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "per_row.db"))
+    create_user_table(conn)
+    report("per-row commit", *load_with_per_row_commit(conn, generate_users(PER_ROW_COUNT)))
+    conn.close()
+
+    for batch_size in (1_000, 50_000):
+        conn = sqlite3.connect(os.path.join(temp_dir, f"bulk_{batch_size}.db"))
+        create_user_table(conn)
+        report(f"bulk batch {batch_size}", *bulk_load_users(conn, generate_users(BULK_COUNT), batch_size))
+        conn.close()
@@ -0,0 +1,267 @@
+# In 006_Sqlite3BasicUsage.py, one global conn/cur pair is shared,
+# and show_select_all and show_select_one all go through it.
+# A sqlite3 connection cannot be used from several threads at the same time,
+# so a service that handles read requests concurrently needs something else.
+# In this file, I will make a connection pool.
+
+# How the pool works
+# In WAL mode, many readers and one writer can work on the same database file at the same time.
+# So the pool has several read connections and exactly one write connection.
+# Read connections are handed out to a thread and returned when the with block ends.
+# The write connection is protected by a lock, so writes are done one at a time.
+# The number of read connections is bounded, and a thread waits if all of them are in use.
+# Before a connection is handed out, a cheap query checks that it still works.
+
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.request import pathname2url
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+class ConnectionPool:
+    def __init__(self, database, max_readers=8, timeout=30.0):
+        self.database = database
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self._created = 0
+        self._created_lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self, read_only=False):
+        # check_same_thread=False is needed because a connection is created in one thread
+        # and used in another. The pool makes sure that only one thread uses it at a time.
+        if read_only:
+            # The path is escaped, so a '?', '#' or '%' in it is not read as part of the URI.
+            uri = f"file:{pathname2url(os.path.abspath(self.database))}?mode=ro"
+            return sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False)
+        return sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _acquire_reader(self):
+        # An idle connection is reused first.
+        # If there is none and the pool is not full, a new one is created.
+        # Otherwise, wait until another thread returns a connection.
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._created_lock:
+                    can_create = self._created < self.max_readers
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect(read_only=True)
+                    except Exception:
+                        # The place that was reserved for the new connection is freed again.
+                        with self._created_lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No read connection was returned within {self.timeout} seconds.")
+            if self._is_healthy(conn):
+                return conn
+            # A broken connection is thrown away and its place in the pool is freed.
+            conn.close()
+            with self._created_lock:
+                self._created -= 1
+
+    @contextmanager
+    def reader(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed pool.")
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            # A connection returned after close() is closed here, because close() has already emptied the pool.
+            # The lock makes sure close() cannot run between the check and put().
+            with self._created_lock:
+                if not self._closed:
+                    self._idle.put(conn)
+                    conn = None
+                else:
+                    self._created -= 1
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def writer(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed pool.")
+        with self._writer_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        with self._created_lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            self._writer.close()
+
+# ====================================================================================================
+
+# The helpers of 006_Sqlite3BasicUsage.py, running through the pool.
+# Each call checks out its own connection, so it can be called from any thread.
+def show_select_all(pool, msg="\nAll User List"):
+    with pool.reader() as conn:
+        rows = conn.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+        """).fetchall()
+    print(msg)
+    for data in rows:
+        print(data)
+
+def select_one(pool, pk):
+    with pool.reader() as conn:
+        return conn.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE id = ?
+        """, (pk,)).fetchone()
+
+def show_select_one(pool, pk, msg="\nOne User"):
+    print(msg)
+    print(select_one(pool, pk))
+
+def update_user(pool, pk, name):
+    with pool.writer() as conn:
+        conn.execute("""
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, {"name":name, "id":pk})
+
+def update_users(pool, user_list):
+    with pool.writer() as conn:
+        conn.executemany("""
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, user_list)
+
+# ====================================================================================================
+
+# Let's repeat the main part of 006_Sqlite3BasicUsage.py with the pool.
+# A database in a temporary directory is used so that 006_database.db is not changed.
+user_list = (
+    (1, "Bonita", "Bonita@example.com", now),
+    (2, "Bono", "Bono@example.com", now),
+    (3, "Belita", "Belita@example.com", now),
+    (4, "Charlotte", "Charlotte@example.com", now),
+    (5, "Cynthia", "Cynthia@example.com", now)
+)
+
+def create_user_table(pool, rows):
+    with pool.writer() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user(
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                email TEXT,
+                regdate TEXT
+            )
+        """)
+        conn.executemany("""
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, rows)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    pool = ConnectionPool(os.path.join(temp_dir, "012_database.db"), max_readers=4)
+    create_user_table(pool, user_list)
+    show_select_all(pool)
+    show_select_one(pool, 3, "\nBefore Update")
+    update_user(pool, 3, "Emma")
+    show_select_one(pool, 3, "After Update")
+    update_users(pool, [
+        {"name":"Erica", "id":1},
+        {"name":"Frances", "id":2},
+        {"name":"Edith", "id":4},
+    ])
+    show_select_all(pool, "After Update many")
+
+    # A connection that is still checked out when the pool closes is closed when it comes back.
+    with pool.reader() as conn:
+        pool.close()
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError as e:
+        print(f"\nReturned after close : {e}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The same number of primary key lookups is split among 1, 2, 4 and 8 threads.
+# sqlite3 releases the GIL while it runs a statement,
+# so the read throughput increases with the number of threads until the CPU cores run out.
+BENCHMARK_USER_COUNT = 100_000
+BENCHMARK_LOOKUP_COUNT = 40_000
+BENCHMARK_THREAD_COUNTS = (1, 2, 4, 8)
+
+def lookup_many(pool, keys):
+    with pool.reader() as conn:
+        for pk in keys:
+            conn.execute("""
+                SELECT id, name, email, regdate
+                FROM user
+                WHERE id = ?
+            """, (pk,)).fetchone()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    database = os.path.join(temp_dir, "012_benchmark.db")
+    pool = ConnectionPool(database, max_readers=max(BENCHMARK_THREAD_COUNTS))
+    create_user_table(pool, ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(BENCHMARK_USER_COUNT)))
+    keys = [pk * 7919 % BENCHMARK_USER_COUNT for pk in range(BENCHMARK_LOOKUP_COUNT)]
+
+    for thread_count in BENCHMARK_THREAD_COUNTS:
+        threads = [
+            threading.Thread(target=lookup_many, args=(pool, keys[index::thread_count]))
+            for index in range(thread_count)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f"{thread_count} threads : {BENCHMARK_LOOKUP_COUNT / elapsed:>12.0f} reads/s")
+    pool.close()
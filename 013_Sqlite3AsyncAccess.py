@@ -0,0 +1,279 @@
+# Every CRUD call in 006_Sqlite3BasicUsage.py blocks the caller until sqlite3 is finished.
+# In an asyncio web service, a blocking call stops the event loop,
+# and every other request has to wait for it.
+# In this file, I will make an async facade for the user table.
+
+# How it works
+# sqlite3 itself has no async API, so the work is sent to a dedicated executor thread.
+# The executor has only one thread, and the connection is created in that thread.
+# So the connection is always used by the same thread, as sqlite3 expects.
+# The event loop only waits for the result with await, and it can serve other coroutines meanwhile.
+# A semaphore caps the number of operations in flight,
+# so a burst of requests does not pile up an unbounded queue in the executor.
+
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+class AsyncUserStore:
+    def __init__(self, database, max_in_flight=64):
+        self.database = database
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite3")
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._conn = None
+
+    async def __aenter__(self):
+        await self._run(self._open)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.database)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user(
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                email TEXT,
+                regdate TEXT
+            )
+        """)
+        self._conn.commit()
+
+    async def _run(self, function, *args):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, function, *args)
+
+    def _execute(self, sql, parameters=()):
+        # Runs in the executor thread. Writes are committed right away, as in 006_Sqlite3BasicUsage.py.
+        try:
+            cur = self._conn.execute(sql, parameters)
+            self._conn.commit()
+            return cur.rowcount
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def _executemany(self, sql, parameters):
+        try:
+            cur = self._conn.executemany(sql, parameters)
+            self._conn.commit()
+            return cur.rowcount
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def _fetchone(self, sql, parameters=()):
+        return self._conn.execute(sql, parameters).fetchone()
+
+    def _fetchmany(self, cur, size):
+        return cur.fetchmany(size)
+
+    async def insert(self, pk, name, email, regdate):
+        return await self._run(self._execute, """
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, (pk, name, email, regdate))
+
+    async def insert_many(self, user_list):
+        return await self._run(self._executemany, """
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, list(user_list))
+
+    async def select_one(self, pk):
+        return await self._run(self._fetchone, """
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE id = ?
+        """, (pk,))
+
+    async def select_by_email(self, email):
+        return await self._run(self._fetchone, """
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE email = ?
+        """, (email,))
+
+    async def select_all(self, batch_size=1000):
+        # A large SELECT is not fetched at once.
+        # The rows are fetched batch by batch in the executor and handed over with async for.
+        # A separate cursor is used, so other operations can run between the batches.
+        cur = await self._run(self._conn.cursor)
+        try:
+            await self._run(cur.execute, """
+                SELECT id, name, email, regdate
+                FROM user
+                ORDER BY id
+            """)
+            while True:
+                rows = await self._run(self._fetchmany, cur, batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            await self._run(cur.close)
+
+    async def update(self, pk, name):
+        return await self._run(self._execute, """
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, {"name":name, "id":pk})
+
+    async def update_many(self, update_user_list):
+        return await self._run(self._executemany, """
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, list(update_user_list))
+
+    async def delete(self, pk):
+        return await self._run(self._execute, """
+            DELETE FROM user
+            WHERE id = ?
+        """, (pk,))
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+# ====================================================================================================
+
+# Let's repeat the CRUD part of 006_Sqlite3BasicUsage.py with await.
+# A database in a temporary directory is used so that 006_database.db is not changed.
+async def crud_example(database):
+    async with AsyncUserStore(database) as store:
+        await store.insert(1, "Bonita", "Bonita@example.com", now)
+        await store.insert(2, "Bono", "Bono@example.com", now)
+        await store.insert_many([
+            (3, "Belita", "Belita@example.com", now),
+            (4, "Charlotte", "Charlotte@example.com", now),
+            (5, "Cynthia", "Cynthia@example.com", now)
+        ])
+        print("\nOne User")
+        print(await store.select_one(2))
+
+        await store.update(3, "Emma")
+        await store.update_many([
+            {"name":"Erica", "id":1},
+            {"name":"Frances", "id":2},
+            {"name":"Edith", "id":4},
+        ])
+        await store.delete(5)
+
+        print("\nAll User List")
+        async for data in store.select_all(batch_size=2):
+            print(data)
+
+        # Several operations can be awaited together.
+        print("\nConcurrent select")
+        print(await asyncio.gather(*(store.select_one(pk) for pk in (1, 3, 5))))
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    asyncio.run(crud_example(os.path.join(temp_dir, "013_database.db")))
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Many requests look up users by email, which is a full table scan without an index.
+# At the same time, a heartbeat coroutine wakes up every millisecond,
+# and how late it wakes up shows how long the event loop was blocked.
+# The sync version calls sqlite3 directly inside the coroutine, like calling the functions of 006.
+# All requests arrive at the same moment, so the latency is measured from that moment.
+BENCHMARK_USER_COUNT = 50_000
+BENCHMARK_REQUEST_COUNT = 200
+HEARTBEAT_INTERVAL = 0.001
+
+def fill_users(database):
+    conn = sqlite3.connect(database)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    conn.executemany("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(BENCHMARK_USER_COUNT)))
+    conn.commit()
+    conn.close()
+
+SELECT_BY_EMAIL = """
+    SELECT id, name, email, regdate
+    FROM user
+    WHERE email = ?
+"""
+
+async def heartbeat(stop, delays):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        delays.append(time.perf_counter() - start - HEARTBEAT_INTERVAL)
+
+async def run_benchmark(name, request):
+    stop = asyncio.Event()
+    delays = []
+    heartbeat_task = asyncio.create_task(heartbeat(stop, delays))
+    latencies = []
+    start = time.perf_counter()
+
+    async def timed_request(pk):
+        await request(pk)
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(timed_request(pk * 97 % BENCHMARK_USER_COUNT) for pk in range(BENCHMARK_REQUEST_COUNT)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await heartbeat_task
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{name:<10} total {elapsed:>7.3f} sec, p50 {p50:>8.2f} ms, p99 {p99:>8.2f} ms, "
+          f"heartbeats {len(delays):>5}, max loop stall {max(delays, default=0) * 1000:>8.2f} ms, "
+          f"mean stall {statistics.fmean(delays or [0]) * 1000:>6.2f} ms")
+
+async def benchmark(database):
+    conn = sqlite3.connect(database)
+
+    async def sync_request(pk):
+        conn.execute(SELECT_BY_EMAIL, (f"user{pk}@example.com",)).fetchone()
+
+    await run_benchmark("sync", sync_request)
+    conn.close()
+
+    async with AsyncUserStore(database) as store:
+        async def async_request(pk):
+            await store.select_by_email(f"user{pk}@example.com")
+
+        await run_benchmark("async", async_request)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    benchmark_database = os.path.join(temp_dir, "013_benchmark.db")
+    fill_users(benchmark_database)
+    asyncio.run(benchmark(benchmark_database))
@@ -0,0 +1,210 @@
+# In 006_Sqlite3BasicUsage.py, show_select_all and the pragma table_info loop call cur.fetchall().
+# fetchall() builds a list of every row before the first row is printed.
+# With millions of rows in the user table, memory jumps up and the first output is late.
+# In this file, I will make a streaming query API.
+
+# There are three ideas.
+# First, fetchmany() takes only arraysize rows at a time, and a generator hands them over one by one.
+# Second, keyset pagination reads the table in pages ordered by id.
+#         Because the next page starts after the last id, a scan can be stopped and resumed later.
+#         Unlike OFFSET, sqlite3 does not have to skip the previous rows again.
+# Third, rows can be returned as small objects with __slots__ instead of tuples,
+#        so the columns can be read by name without the cost of a dict per row.
+
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+# Row object
+# __slots__ fixes the attributes of the class, so an instance has no __dict__.
+# It is a little bigger than a tuple, but much smaller than a dict, and columns have names.
+class UserRow:
+    __slots__ = ("id", "name", "email", "regdate")
+
+    def __init__(self, id, name, email, regdate):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.regdate = regdate
+
+    def __repr__(self):
+        return f"UserRow(id={self.id!r}, name={self.name!r}, email={self.email!r}, regdate={self.regdate!r})"
+
+def user_row_factory(cursor, row):
+    return UserRow(*row)
+
+# ====================================================================================================
+
+# Streaming with fetchmany
+# arraysize decides how many rows are fetched at a time.
+# A larger value means fewer calls, and a smaller value means less memory.
+def iter_rows(conn, sql, parameters=(), arraysize=1000, row_factory=None):
+    cur = conn.cursor()
+    cur.arraysize = arraysize
+    if row_factory is not None:
+        cur.row_factory = row_factory
+    try:
+        cur.execute(sql, parameters)
+        while True:
+            rows = cur.fetchmany()
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+# Keyset pagination
+# Each page is a separate query, so no cursor stays open between pages.
+# The caller can save the last id and resume the scan from there, even after a restart.
+def iter_users_by_keyset(conn, after_id=None, page_size=1000, row_factory=None):
+    last_id = after_id
+    while True:
+        if last_id is None:
+            sql = """
+                SELECT id, name, email, regdate
+                FROM user
+                ORDER BY id
+                LIMIT ?
+            """
+            parameters = (page_size,)
+        else:
+            sql = """
+                SELECT id, name, email, regdate
+                FROM user
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """
+            parameters = (last_id, page_size)
+        count = 0
+        for row in iter_rows(conn, sql, parameters, page_size, row_factory):
+            count += 1
+            last_id = row.id if isinstance(row, UserRow) else row[0]
+            yield row
+        if count < page_size:
+            break
+
+def show_select_all(conn, msg="\nAll User List", row_factory=None):
+    print(msg)
+    for data in iter_rows(conn, """
+        SELECT id, name, email, regdate
+        FROM user
+    """, row_factory=row_factory):
+        print(data)
+
+# ====================================================================================================
+
+# Let's look at the table of 006_Sqlite3BasicUsage.py in a temporary database.
+def create_users(conn, rows):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    conn.executemany("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "014_database.db"))
+    create_users(conn, (
+        (1, "Bonita", "Bonita@example.com", now),
+        (2, "Bono", "Bono@example.com", now),
+        (3, "Belita", "Belita@example.com", now),
+        (4, "Charlotte", "Charlotte@example.com", now),
+        (5, "Cynthia", "Cynthia@example.com", now)
+    ))
+
+    print("\nTable Information")
+    for cid, name, tp, notnull, dflt_value, pk in iter_rows(conn, "pragma table_info(user)"):
+        print(f"cid:{cid}, name:{name}, type:{tp}, dflt_value:{dflt_value}, pk:{pk}")
+
+    show_select_all(conn)
+    show_select_all(conn, "\nAll User List (UserRow)", user_row_factory)
+
+    # Read two users, stop, and resume from the saved id.
+    print("\nKeyset pagination")
+    last_id = None
+    for row in iter_users_by_keyset(conn, page_size=2, row_factory=user_row_factory):
+        print(f"first run : {row.id} {row.name}")
+        last_id = row.id
+        if row.id == 2:
+            break
+    for row in iter_users_by_keyset(conn, after_id=last_id, page_size=2, row_factory=user_row_factory):
+        print(f"resumed : {row.id} {row.name}")
+    conn.close()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The same query is consumed with fetchall() and with the streaming API.
+# Time to first row, total time and peak memory are measured for several table sizes.
+# The peak memory of fetchall() grows with the result, and that of streaming stays the same.
+BENCHMARK_SIZES = (10_000, 100_000, 1_000_000)
+SELECT_ALL = """
+    SELECT id, name, email, regdate
+    FROM user
+"""
+
+def consume_fetchall(conn):
+    cur = conn.cursor()
+    cur.execute(SELECT_ALL)
+    rows = cur.fetchall()
+    first = time.perf_counter()
+    for _ in rows:
+        pass
+    return first
+
+def consume_iter_rows(conn):
+    first = None
+    for _ in iter_rows(conn, SELECT_ALL):
+        if first is None:
+            first = time.perf_counter()
+    return first
+
+def consume_keyset(conn):
+    first = None
+    for _ in iter_users_by_keyset(conn, page_size=1000, row_factory=user_row_factory):
+        if first is None:
+            first = time.perf_counter()
+    return first
+
+def benchmark(name, function, conn):
+    start = time.perf_counter()
+    first = function(conn)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(conn)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"    {name:<12} first row {(first - start) * 1000:>9.2f} ms, "
+          f"total {elapsed:>7.3f} sec, peak {peak / (1024 * 1024):>8.2f} MB")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    for size in BENCHMARK_SIZES:
+        conn = sqlite3.connect(os.path.join(temp_dir, f"014_benchmark_{size}.db"))
+        create_users(conn, ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(1, size + 1)))
+        print(f"{size} rows")
+        benchmark("fetchall", consume_fetchall, conn)
+        benchmark("iter_rows", consume_iter_rows, conn)
+        benchmark("keyset", consume_keyset, conn)
+        conn.close()
@@ -0,0 +1,263 @@
+# In 006_Sqlite3BasicUsage.py, show_select_one(pk) runs the same SELECT ... WHERE id = ? again and again.
+# In a read-heavy service, the same primary keys are asked for constantly,
+# and every time sqlite3 has to look up the row and Python has to build the tuple again.
+# In this file, I will put a cache in front of the user lookups.
+
+# The cache has a few rules.
+# LRU (Least Recently Used) : when the cache is full, the row that was used longest ago is removed.
+#                             So memory is bounded by the number of entries.
+# TTL (Time To Live) : a row is used only for a fixed time, and then it is read from the DB again.
+# Invalidation : the INSERT, UPDATE and DELETE helpers remove the rows they touch from the cache,
+#                so a stale row is never returned after a change made through them.
+# Counters for hits, misses, evictions and so on show whether maxsize and ttl are well chosen.
+
+# Statement cache
+# sqlite3 keeps compiled statements for the SQL strings it has seen (128 by default).
+# The cached_statements parameter of connect() raises this number.
+# With a fixed set of queries, every statement is compiled only once.
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+# LRU / TTL cache
+# OrderedDict remembers the order of the keys, and move_to_end() marks a key as recently used.
+# popitem(last=False) removes the oldest key.
+class LRUCache:
+    def __init__(self, maxsize=10_000, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value, expires_at = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires_at is not None and expires_at <= self.clock():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+# ====================================================================================================
+
+# Cached user store
+# A missing user is cached too (as MISSING), so asking for a deleted id again does not go to the DB.
+# That is why INSERT also has to invalidate the id.
+MISSING = object()
+
+class CachedUserStore:
+    def __init__(self, conn, maxsize=10_000, ttl=60.0):
+        self.conn = conn
+        self.cache = LRUCache(maxsize, ttl)
+
+    def select_one(self, pk):
+        row = self.cache.get(pk, MISSING)
+        if row is MISSING:
+            row = self.conn.execute("""
+                SELECT id, name, email, regdate
+                FROM user
+                WHERE id = ?
+            """, (pk,)).fetchone()
+            self.cache.put(pk, row)
+        return row
+
+    def show_select_one(self, pk, msg="\nOne User"):
+        print(msg)
+        print(self.select_one(pk))
+
+    def insert(self, pk, name, email, regdate):
+        self.conn.execute("""
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, (pk, name, email, regdate))
+        self.conn.commit()
+        self.cache.invalidate(pk)
+
+    def insert_many(self, user_list):
+        user_list = list(user_list)
+        self.conn.executemany("""
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, user_list)
+        self.conn.commit()
+        for pk, *_ in user_list:
+            self.cache.invalidate(pk)
+
+    def update(self, pk, name):
+        self.conn.execute("""
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, {"name":name, "id":pk})
+        self.conn.commit()
+        self.cache.invalidate(pk)
+
+    def update_many(self, update_user_list):
+        update_user_list = list(update_user_list)
+        self.conn.executemany("""
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, update_user_list)
+        self.conn.commit()
+        for user in update_user_list:
+            self.cache.invalidate(user["id"])
+
+    def delete(self, pk):
+        self.conn.execute("""
+            DELETE FROM user
+            WHERE id = ?
+        """, (pk,))
+        self.conn.commit()
+        self.cache.invalidate(pk)
+
+# ====================================================================================================
+
+# Let's follow the flow of 006_Sqlite3BasicUsage.py and watch the counters.
+STATEMENT_CACHE_SIZE = 512
+
+def create_user_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    conn.commit()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "015_database.db"), cached_statements=STATEMENT_CACHE_SIZE)
+    create_user_table(conn)
+    store = CachedUserStore(conn, maxsize=3)
+    store.insert_many((
+        (1, "Bonita", "Bonita@example.com", now),
+        (2, "Bono", "Bono@example.com", now),
+        (3, "Belita", "Belita@example.com", now),
+        (4, "Charlotte", "Charlotte@example.com", now),
+        (5, "Cynthia", "Cynthia@example.com", now)
+    ))
+
+    store.show_select_one(2)
+    store.show_select_one(2, "\nOne User (from cache)")
+
+    store.show_select_one(3, "\nBefore Update")
+    store.update(3, "Emma")
+    store.show_select_one(3, "After Update")
+
+    store.update_many([
+        {"name":"Erica", "id":1},
+        {"name":"Frances", "id":2},
+        {"name":"Edith", "id":4},
+    ])
+    store.show_select_one(2, "\nAfter Update many")
+
+    store.delete(3)
+    store.show_select_one(3, "\nAfter Delete")
+    store.show_select_one(3, "After Delete (from cache)")
+    print(f"\nCache stats : {store.cache.stats()}")
+    conn.close()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Lookups follow a skewed distribution where a few keys are asked for most of the time,
+# as in a read-heavy service. The same lookups are run with and without the cache.
+BENCHMARK_USER_COUNT = 100_000
+BENCHMARK_LOOKUP_COUNT = 200_000
+BENCHMARK_CACHE_SIZES = (1_000, 10_000)
+
+def select_one_uncached(conn, pk):
+    return conn.execute("""
+        SELECT id, name, email, regdate
+        FROM user
+        WHERE id = ?
+    """, (pk,)).fetchone()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "015_benchmark.db"), cached_statements=STATEMENT_CACHE_SIZE)
+    create_user_table(conn)
+    CachedUserStore(conn).insert_many(
+        (pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(1, BENCHMARK_USER_COUNT + 1)
+    )
+    random.seed(15)
+    keys = [min(BENCHMARK_USER_COUNT, int(random.paretovariate(0.5))) for _ in range(BENCHMARK_LOOKUP_COUNT)]
+
+    start = time.perf_counter()
+    for pk in keys:
+        select_one_uncached(conn, pk)
+    elapsed = time.perf_counter() - start
+    print(f"{'no cache':<18} {BENCHMARK_LOOKUP_COUNT / elapsed:>12.0f} lookups/s")
+
+    for cache_size in BENCHMARK_CACHE_SIZES:
+        store = CachedUserStore(conn, maxsize=cache_size)
+        start = time.perf_counter()
+        for pk in keys:
+            store.select_one(pk)
+        elapsed = time.perf_counter() - start
+        stats = store.cache.stats()
+        print(f"{f'cache {cache_size}':<18} {BENCHMARK_LOOKUP_COUNT / elapsed:>12.0f} lookups/s, "
+              f"hit rate {stats['hit_rate']:.1%}, evictions {stats['evictions']}")
+    conn.close()
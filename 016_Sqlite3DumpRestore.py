@@ -0,0 +1,350 @@
+# At the end of 006_Sqlite3BasicUsage.py, 006_dump.sql is written
+# by calling f.write once per line of conn.iterdump().
+# iterdump() makes one INSERT statement per row on one thread,
+# and replaying it also runs one statement per row.
+# For a database of several GB, both the dump and the restore take a long time.
+# In this file, I will make a dump and restore toolkit for the user table.
+
+# The toolkit has four parts.
+# Online backup : sqlite3.Connection.backup copies the database page by page while it is in use,
+#                 and a progress callback is called after every step.
+# Batched dump : rows are written as multi-row INSERT statements through a large write buffer.
+#                The dump can be split into id ranges and written by several threads at the same time.
+# Incremental dump : only the rows changed since the last dump are exported.
+#                    Triggers keep a change counter per user, and the counter of the last dump
+#                    is saved in a small state file next to the dump.
+# Restore : the statements are replayed in large transactions instead of one commit per statement.
+
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.request import pathname2url
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+ROWS_PER_INSERT = 500
+STATEMENTS_PER_TRANSACTION = 200
+
+# ====================================================================================================
+
+# Online backup
+# pages is the number of pages copied in one step. -1 copies everything in one step.
+# Between the steps, other connections can keep using the source database.
+def backup_database(conn, target_path, pages=1024, progress=None):
+    target = sqlite3.connect(target_path)
+    try:
+        conn.backup(target, pages=pages, progress=progress)
+    finally:
+        target.close()
+
+def print_progress(status, remaining, total):
+    print(f"Copied {total - remaining} of {total} pages...")
+
+# ====================================================================================================
+
+# Batched dump
+# quote() is a sqlite function that turns a value into an SQL literal,
+# so strings, numbers, NULL and BLOB are written exactly as sqlite3 would read them back.
+# Each INSERT statement has up to ROWS_PER_INSERT rows.
+def write_insert_batches(conn, f, where="", parameters=()):
+    cur = conn.cursor()
+    cur.arraysize = ROWS_PER_INSERT
+    cur.execute(f"""
+        SELECT '(' || quote(id) || ',' || quote(name) || ',' || quote(email) || ',' || quote(regdate) || ')'
+        FROM user
+        {where}
+        ORDER BY id
+    """, parameters)
+    total = 0
+    while True:
+        rows = cur.fetchmany()
+        if not rows:
+            break
+        f.write("INSERT OR REPLACE INTO user (id, name, email, regdate) VALUES\n")
+        f.write(",\n".join(values for values, in rows))
+        f.write(";\n")
+        total += len(rows)
+    cur.close()
+    return total
+
+def write_schema(conn, f):
+    for sql, in conn.execute("""
+        SELECT sql
+        FROM sqlite_master
+        WHERE tbl_name = 'user' AND type IN ('table', 'index') AND sql IS NOT NULL
+        ORDER BY type DESC
+    """):
+        # IF NOT EXISTS is added so that the schema can be replayed into an existing database.
+        sql = sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1)
+        sql = sql.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+        f.write(f"{sql};\n")
+
+def dump_users(conn, dump_path):
+    with open(dump_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        write_schema(conn, f)
+        return write_insert_batches(conn, f)
+
+# Parallel dump
+# The id range is split into as many parts as workers,
+# and every worker writes its part with its own read-only connection.
+# The parts are numbered, so restoring them in order gives the same result as one dump.
+def dump_users_parallel(database, dump_dir, workers=4):
+    conn = sqlite3.connect(database)
+    low, high = conn.execute("SELECT min(id), max(id) FROM user").fetchone()
+    schema_path = os.path.join(dump_dir, "part_000.sql")
+    with open(schema_path, "w", encoding="utf-8") as f:
+        write_schema(conn, f)
+    conn.close()
+    if low is None:
+        return [schema_path], 0
+
+    step = (high - low) // workers + 1
+    starts = [low + step * number for number in range(workers)]
+    ends = [start + step for start in starts]
+
+    def dump_part(number, start, end):
+        part_path = os.path.join(dump_dir, f"part_{number + 1:03d}.sql")
+        # The path is escaped, so a '?', '#' or '%' in it is not read as part of the URI.
+        part_conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(database))}?mode=ro", uri=True)
+        try:
+            with open(part_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+                total = write_insert_batches(part_conn, f, "WHERE id >= ? AND id < ?", (start, end))
+        finally:
+            part_conn.close()
+        return part_path, total
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(dump_part, range(workers), starts, ends))
+    return [schema_path] + [path for path, _ in results], sum(total for _, total in results)
+
+# ====================================================================================================
+
+# Incremental dump
+# regdate cannot tell what changed: it has a resolution of one second,
+# and the UPDATE statements of 006_Sqlite3BasicUsage.py do not touch it at all.
+# Instead, triggers give every changed user a new number in user_version, one higher than any before.
+# A dump exports the users whose number is higher than the one saved by the previous dump.
+# Deleted users keep their row in user_version, so the dump can write a DELETE for them.
+# Reading the highest number before the rows means a change made during the dump is exported again
+# next time at worst, which is harmless because the dump uses INSERT OR REPLACE.
+def enable_change_tracking(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_version(
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    # With the index, max(version) is a single lookup instead of a scan.
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS user_version_idx ON user_version(version)
+    """)
+    for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS user_version_after_{event.lower()} AFTER {event} ON user BEGIN
+                INSERT OR REPLACE INTO user_version (user_id, version)
+                VALUES ({row}.id, (SELECT coalesce(max(version), 0) + 1 FROM user_version));
+            END
+        """)
+    # Users that existed before tracking was enabled count as changed once.
+    cur.execute("""
+        INSERT OR IGNORE INTO user_version (user_id, version)
+        SELECT id, 1
+        FROM user
+    """)
+    conn.commit()
+
+def dump_users_incremental(conn, dump_path, state_path=None):
+    state_path = state_path or f"{dump_path}.state"
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            last_version = json.load(f)["last_version"]
+    except FileNotFoundError:
+        last_version = 0
+    newest, = conn.execute("SELECT max(version) FROM user_version").fetchone()
+    with open(dump_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        write_schema(conn, f)
+        total = write_insert_batches(conn, f, """
+            WHERE id IN (SELECT user_id FROM user_version WHERE version > ?)
+        """, (last_version,))
+        deleted = [pk for pk, in conn.execute("""
+            SELECT user_id
+            FROM user_version
+            WHERE version > ? AND user_id NOT IN (SELECT id FROM user)
+            ORDER BY user_id
+        """, (last_version,))]
+        for start in range(0, len(deleted), ROWS_PER_INSERT):
+            f.write(f"DELETE FROM user WHERE id IN ({','.join(map(str, deleted[start:start + ROWS_PER_INSERT]))});\n")
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"last_version": newest or last_version}, f)
+    return total + len(deleted)
+
+# ====================================================================================================
+
+# Restore
+# Lines are collected until sqlite3.complete_statement says a statement is finished.
+# A statement can only end on a line that ends with ';', so only those lines are checked.
+# Every STATEMENTS_PER_TRANSACTION statements are committed together.
+# isolation_level=None lets us control BEGIN and COMMIT ourselves.
+def iter_statements(dump_path):
+    statement = []
+    with open(dump_path, "r", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        for line in f:
+            statement.append(line)
+            if not line.rstrip().endswith(";"):
+                continue
+            text = "".join(statement)
+            if sqlite3.complete_statement(text):
+                yield text
+                statement = []
+
+def restore_users(database, dump_paths):
+    conn = sqlite3.connect(database, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    try:
+        for dump_path in dump_paths:
+            conn.execute("BEGIN")
+            count = 0
+            for statement in iter_statements(dump_path):
+                conn.execute(statement)
+                count += 1
+                if count % STATEMENTS_PER_TRANSACTION == 0:
+                    conn.execute("COMMIT")
+                    conn.execute("BEGIN")
+            conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+# ====================================================================================================
+
+def create_users(database, rows):
+    conn = sqlite3.connect(database)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    conn.executemany("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return conn
+
+# Let's try every part with the users of 006_Sqlite3BasicUsage.py.
+# Everything happens in a temporary directory so that the datasets folder is not changed.
+with tempfile.TemporaryDirectory() as temp_dir:
+    database = os.path.join(temp_dir, "016_database.db")
+    earlier = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = create_users(database, (
+        (1, "Bonita", "Bonita@example.com", earlier),
+        (2, "Bono", "Bono@example.com", earlier),
+        (3, "Belita", "Belita@example.com", earlier),
+    ))
+
+    print("Online backup")
+    backup_database(conn, os.path.join(temp_dir, "016_backup.db"), pages=1, progress=print_progress)
+
+    dump_path = os.path.join(temp_dir, "016_dump.sql")
+    print(f"\nBatched dump : {dump_users(conn, dump_path)} rows")
+    with open(dump_path, encoding="utf-8") as f:
+        print(f.read())
+
+    incremental_path = os.path.join(temp_dir, "016_incremental.sql")
+    enable_change_tracking(conn)
+    print(f"First incremental dump : {dump_users_incremental(conn, incremental_path)} rows")
+    # The UPDATE of 006_Sqlite3BasicUsage.py leaves regdate alone,
+    # and the new user has the same regdate as the existing ones. Both are still exported.
+    conn.execute("""
+        UPDATE user
+        SET name = :name, email = :name || '@example.com'
+        WHERE id = :id
+    """, {"name":"Emma", "id":3})
+    conn.execute("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, (4, "Charlotte", "Charlotte@example.com", earlier))
+    conn.execute("""
+        DELETE FROM user
+        WHERE id = ?
+    """, (2,))
+    conn.commit()
+    print(f"Second incremental dump : {dump_users_incremental(conn, incremental_path)} rows")
+    with open(incremental_path, encoding="utf-8") as f:
+        print(f.read())
+
+    restored = os.path.join(temp_dir, "016_restored.db")
+    restore_users(restored, [dump_path, incremental_path])
+    restored_conn = sqlite3.connect(restored)
+    print("\nRestored User List")
+    for data in restored_conn.execute("SELECT id, name, email, regdate FROM user ORDER BY id"):
+        print(data)
+    restored_conn.close()
+    conn.close()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The iterdump() loop of 006_Sqlite3BasicUsage.py and executescript() to replay it
+# are compared with the toolkit on the same database.
+BENCHMARK_USER_COUNT = 300_000
+BENCHMARK_WORKERS = 4
+
+def measure(name, function):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<25} {elapsed:>8.3f} sec {BENCHMARK_USER_COUNT / elapsed:>12.0f} rows/s")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    database = os.path.join(temp_dir, "016_benchmark.db")
+    conn = create_users(database, ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(BENCHMARK_USER_COUNT)))
+
+    iterdump_path = os.path.join(temp_dir, "iterdump.sql")
+    def dump_with_iterdump():
+        with open(iterdump_path, "w") as f:
+            for line in conn.iterdump():
+                f.write(f"{line}\n")
+    measure("dump : iterdump", dump_with_iterdump)
+
+    backup_path = os.path.join(temp_dir, "backup.db")
+    measure("dump : backup API", lambda: backup_database(conn, backup_path, pages=-1))
+
+    batched_path = os.path.join(temp_dir, "batched.sql")
+    measure("dump : batched", lambda: dump_users(conn, batched_path))
+
+    parallel_dir = os.path.join(temp_dir, "parallel")
+    os.mkdir(parallel_dir)
+    parallel_parts = []
+    measure("dump : batched parallel", lambda: parallel_parts.extend(dump_users_parallel(database, parallel_dir, BENCHMARK_WORKERS)[0]))
+
+    def restore_with_executescript():
+        restore_conn = sqlite3.connect(os.path.join(temp_dir, "restored_iterdump.db"))
+        with open(iterdump_path) as f:
+            restore_conn.executescript(f.read())
+        restore_conn.close()
+    measure("restore : executescript", restore_with_executescript)
+
+    measure("restore : batched", lambda: restore_users(os.path.join(temp_dir, "restored_batched.db"), [batched_path]))
+    measure("restore : parallel parts", lambda: restore_users(os.path.join(temp_dir, "restored_parallel.db"), parallel_parts))
+    conn.close()
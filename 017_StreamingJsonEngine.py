@@ -0,0 +1,261 @@
+# In 005_AboutOpenFunction.py, 005_json_ex.json is written with json.dump(..., indent=4)
+# and read back with json.load.
+# Both of them need the whole students array in memory,
+# and indent=4 makes the file much bigger with spaces and line breaks.
+# With tens of millions of student records, this does not work.
+# In this file, I will make a streaming JSON toolkit for the same schema.
+
+# NDJSON (Newline Delimited JSON)
+# One record is written as one line of compact JSON.
+# It can be read line by line, appended to, and split at any line break,
+# so it goes well with the flat file ideas of 005_AboutOpenFunction.py.
+
+# Incremental array reader
+# If the file must stay a normal JSON document like {"students": [...]},
+# the array is decoded one element at a time with JSONDecoder.raw_decode.
+# raw_decode decodes one value from the start of a string and returns where it ended,
+# so only the current chunk of the file is kept in memory.
+
+# Compact separators and cached encoder
+# separators=(",", ":") removes the spaces that json.dumps puts after ',' and ':'.
+# json.dumps creates a new JSONEncoder for every call when options are given,
+# so the encoder is created once and its encode method is reused for every record.
+
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+READ_CHUNK_SIZE = 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+COMPACT_SEPARATORS = (",", ":")
+# The longest text a cut token can leave at the end of the buffer, like "-Infinit" or "\u12".
+MAX_CUT_TOKEN_LENGTH = 16
+
+# ====================================================================================================
+
+# Encoder and decoder are created once and reused.
+# check_circular=False skips the check for self-referencing objects,
+# which plain records made of dicts, lists, strings and numbers never have.
+compact_encoder = json.JSONEncoder(separators=COMPACT_SEPARATORS, ensure_ascii=False, check_circular=False)
+encode_record = compact_encoder.encode
+record_decoder = json.JSONDecoder()
+decode_record = record_decoder.decode
+
+# ====================================================================================================
+
+# NDJSON
+def write_ndjson(path, records, mode="w"):
+    count = 0
+    with open(path, mode, encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        for record in records:
+            f.write(encode_record(record))
+            f.write("\n")
+            count += 1
+    return count
+
+def read_ndjson(path):
+    with open(path, "r", encoding="utf-8", buffering=READ_CHUNK_SIZE) as f:
+        for line in f:
+            if line.strip():
+                yield decode_record(line)
+
+# ====================================================================================================
+
+# Streaming JSON array
+# write_json_array writes {"key": [record, record, ...]} without building the whole dict.
+def write_json_array(path, key, records):
+    count = 0
+    with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(f"{{{encode_record(key)}:[")
+        for record in records:
+            if count:
+                f.write(",")
+            f.write(encode_record(record))
+            count += 1
+        f.write("]}")
+    return count
+
+# iter_json_array reads the elements of one array.
+# If key is None, the document itself must be an array.
+# Otherwise, the array must be the value of a key of the top-level object, like "students".
+# The key is searched as text, so it should not appear in a string before the array.
+def iter_json_array(path, key=None):
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        position = 0
+
+        def fill():
+            nonlocal buffer, position
+            chunk = f.read(READ_CHUNK_SIZE)
+            buffer = buffer[position:] + chunk
+            position = 0
+            return bool(chunk)
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n":
+                    position += 1
+                if position < len(buffer) or not fill():
+                    return
+
+        # Find the start of the array.
+        marker = "[" if key is None else encode_record(key)
+        while True:
+            found = buffer.find(marker, position)
+            if found != -1:
+                position = found + len(marker)
+                break
+            # Keep the end of the buffer in case the marker is split between two chunks.
+            position = max(position, len(buffer) - len(marker))
+            if not fill():
+                raise ValueError(f"{marker} was not found in {path}")
+        if key is not None:
+            for expected in ":[":
+                skip_whitespace()
+                if buffer[position:position + 1] != expected:
+                    raise ValueError(f"The value of {marker} is not an array")
+                position += 1
+
+        skip_whitespace()
+        if buffer[position:position + 1] == "]":
+            return
+        while True:
+            # raw_decode fails if the element is cut at the end of the buffer.
+            # Then more text is read and the same element is tried again.
+            # An error anywhere else is in the file itself, so it is raised without reading the rest.
+            # A cut string is reported at the position where the string starts, not at the end.
+            try:
+                record, end = record_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                cut = e.msg.startswith("Unterminated string") or len(buffer) - e.pos <= MAX_CUT_TOKEN_LENGTH
+                if not cut or not fill():
+                    raise
+                continue
+            # A number may be cut and still be decoded, like 12 of 123 or 1 of 1.5.
+            # So the element must be followed by a separator before it is accepted.
+            if buffer[end:end + 1] not in (" ", "\t", "\r", "\n", ",", "]") and fill():
+                continue
+            position = end
+            yield record
+            skip_whitespace()
+            separator = buffer[position:position + 1]
+            position += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' but found {separator!r}")
+            skip_whitespace()
+
+# ====================================================================================================
+
+# Let's use the students of 005_AboutOpenFunction.py.
+students = [
+    {
+        "name" : "Dave",
+        "age" : 24,
+        "car" : {
+            "brend" : "Audi",
+            "type" : "SUV"
+        }
+    },
+    {
+        "name" : "Lee",
+        "age" : 22,
+        "car" : {
+            "brend" : "BMW",
+            "type" : "SUV"
+        }
+    }
+]
+
+print("Students from 005_json_ex.json")
+for student in iter_json_array(get_path("datasets", "005_json_ex.json"), "students"):
+    print(student)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    ndjson_path = os.path.join(temp_dir, "017_students.ndjson")
+    write_ndjson(ndjson_path, students)
+    with open(ndjson_path, encoding="utf-8") as f:
+        print(f"\nNDJSON file\n{f.read()}")
+    print("Students from NDJSON")
+    for student in read_ndjson(ndjson_path):
+        print(student)
+
+    array_path = os.path.join(temp_dir, "017_students.json")
+    write_json_array(array_path, "students", students)
+    with open(array_path, encoding="utf-8") as f:
+        print(f"\nCompact JSON file\n{f.read()}")
+    indent_size = len(json.dumps({"students": students}, indent=4))
+    print(f"indent=4 : {indent_size} bytes, compact : {os.path.getsize(array_path)} bytes")
+
+    # A broken element is reported at once, even if the rest of the file is large.
+    broken_path = os.path.join(temp_dir, "017_broken.json")
+    with open(broken_path, "w", encoding="utf-8") as f:
+        f.write('{"students":[{"name":"Dave","age":24,,"car":null},')
+        f.write(",".join([encode_record(students[1])] * 100_000) + "]}")
+    try:
+        for student in iter_json_array(broken_path, "students"):
+            pass
+    except json.JSONDecodeError as e:
+        print(f"\nBroken file : {e}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Synthetic students are written and read in four ways.
+# The numbers are records per second and the peak memory measured by tracemalloc in a separate run.
+BENCHMARK_RECORD_COUNT = 200_000
+BRENDS = ("Audi", "BMW", "Kia", "Hyundai")
+
+def generate_students(count):
+    for number in range(count):
+        yield {
+            "name" : f"student{number}",
+            "age" : 20 + number % 10,
+            "car" : {
+                "brend" : BRENDS[number % len(BRENDS)],
+                "type" : "SUV"
+            }
+        }
+
+def dump_with_json(path):
+    with open(path, "w") as f:
+        json.dump({"students": list(generate_students(BENCHMARK_RECORD_COUNT))}, f, indent=4)
+
+def load_with_json(path):
+    with open(path, "r") as f:
+        return sum(1 for _ in json.load(f)["students"])
+
+def measure(name, function, path):
+    start = time.perf_counter()
+    function(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} {BENCHMARK_RECORD_COUNT / elapsed:>10.0f} records/s {peak / (1024 * 1024):>10.2f} MB peak "
+          f"{os.path.getsize(path) / (1024 * 1024):>8.2f} MB file")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    indent_path = os.path.join(temp_dir, "indent.json")
+    ndjson_path = os.path.join(temp_dir, "students.ndjson")
+    array_path = os.path.join(temp_dir, "students.json")
+
+    measure("write : json.dump indent=4", dump_with_json, indent_path)
+    measure("write : NDJSON", lambda path: write_ndjson(path, generate_students(BENCHMARK_RECORD_COUNT)), ndjson_path)
+    measure("write : compact array", lambda path: write_json_array(path, "students", generate_students(BENCHMARK_RECORD_COUNT)), array_path)
+
+    measure("read : json.load", load_with_json, indent_path)
+    measure("read : NDJSON", lambda path: sum(1 for _ in read_ndjson(path)), ndjson_path)
+    measure("read : streaming array", lambda path: sum(1 for _ in iter_json_array(path, "students")), array_path)
@@ -0,0 +1,184 @@
+# Every script so far processes one file at a time on one core.
+# plan.txt says the project is heading toward handling lots of csv, json and Excel files,
+# and nightly jobs over thousands of files need every core of the machine.
+# In this file, I will make a batch-processing entry point with a process pool.
+
+# How the work is split
+# 1. The files under datasets are found with get_path.
+# 2. A large file is split into byte ranges.
+#    The border of each range is moved to the next line break,
+#    so no line is cut in half and every line belongs to exactly one range.
+# 3. Every range is sent to a ProcessPoolExecutor as one task.
+#    Processes are used instead of threads because the GIL lets only one thread run Python code at a time.
+# 4. The results come back in the order of the tasks, whichever worker finishes first,
+#    and each worker reports how many bytes it processed and how long it took.
+
+# Note that on Windows and macOS, a new process imports this file again,
+# so the part that starts the pool must be under if __name__ == "__main__".
+
+import os
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+CHUNK_SIZE = 8 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+# ====================================================================================================
+
+# Finding files
+def find_files(*directory, extensions=None):
+    root = get_path(*directory)
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in sorted(file_names):
+            if extensions is None or os.path.splitext(file_name)[1] in extensions:
+                yield os.path.join(dir_path, file_name)
+
+# Splitting a file into byte ranges
+# Each border is moved forward to the start of the next line, so a line is never split between two workers.
+# Only the bytes from the border to the next line break are read, one block at a time,
+# however long that line is, so splitting does not read the whole file.
+# A binary file has no lines, so it is split only by size.
+def next_line_start(f, position, size):
+    f.seek(position)
+    while True:
+        block = f.read(READ_BUFFER_SIZE)
+        if not block:
+            return size
+        found = block.find(b"\n")
+        if found != -1:
+            return position + found + 1
+        position += len(block)
+
+def split_file(path, chunk_size=CHUNK_SIZE, align_to_lines=True):
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(path, 0, 0)]
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = min(size, start + chunk_size)
+            if align_to_lines and end < size:
+                end = next_line_start(f, end, size)
+            ranges.append((path, start, end))
+            start = end
+    return ranges
+
+# ====================================================================================================
+
+# Worker
+# The worker gets only the path and the range, not the data,
+# so very little has to be sent to the other process.
+# It must be a top-level function so that it can be pickled.
+def count_range(task):
+    path, start, end = task
+    started = time.perf_counter()
+    lines = words = 0
+    # A block border can cut a word in half, even inside a very long line.
+    # If the previous block ended inside a word and this one starts inside a word,
+    # the two halves were counted as two words, so one is taken off.
+    in_word = False
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(READ_BUFFER_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            lines += block.count(b"\n")
+            words += len(block.split())
+            if in_word and not block[:1].isspace():
+                words -= 1
+            in_word = not block[-1:].isspace()
+    return {
+        "path": path,
+        "start": start,
+        "bytes": end - start,
+        "lines": lines,
+        "words": words,
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - started,
+    }
+
+# Merging
+# The results of the ranges of one file are added up, in the same order as the files.
+def merge_results(results):
+    merged = {}
+    for result in results:
+        total = merged.setdefault(result["path"], {"bytes": 0, "lines": 0, "words": 0, "chunks": 0})
+        total["bytes"] += result["bytes"]
+        total["lines"] += result["lines"]
+        total["words"] += result["words"]
+        total["chunks"] += 1
+    return merged
+
+def worker_report(results):
+    workers = defaultdict(lambda: {"bytes": 0, "seconds": 0.0, "tasks": 0})
+    for result in results:
+        worker = workers[result["pid"]]
+        worker["bytes"] += result["bytes"]
+        worker["seconds"] += result["seconds"]
+        worker["tasks"] += 1
+    for pid, worker in sorted(workers.items()):
+        throughput = worker["bytes"] / (1024 * 1024) / worker["seconds"] if worker["seconds"] else 0.0
+        print(f"worker {pid:>7} : {worker['tasks']:>4} tasks {worker['bytes']:>12} bytes {throughput:>10.1f} MB/s")
+
+def process_files(paths, worker=count_range, max_workers=None, chunk_size=CHUNK_SIZE):
+    tasks = []
+    for path in paths:
+        tasks.extend(split_file(path, chunk_size, align_to_lines=not path.endswith(".bin")))
+    # executor.map returns the results in the order of the tasks.
+    # chunksize sends several small tasks to a worker at once to save communication.
+    batch = max(1, len(tasks) // ((max_workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(worker, tasks, chunksize=batch))
+
+# ====================================================================================================
+
+if __name__ == "__main__":
+    # Let's process every file of the datasets folder.
+    dataset_paths = list(find_files("datasets", extensions={".txt", ".json", ".bin", ".sql"}))
+    results = process_files(dataset_paths, chunk_size=128)
+    for path, total in merge_results(results).items():
+        print(f"{os.path.relpath(path, BASE_DIR):<35} {total['chunks']:>3} chunks {total['bytes']:>6} bytes "
+              f"{total['lines']:>4} lines {total['words']:>5} words")
+    print()
+    worker_report(results)
+
+    result_delimiter()
+
+    # Benchmark
+    # Synthetic flat files are processed with 1 worker and with every core.
+    # The result must be the same, and the time should shrink with the number of cores.
+    BENCHMARK_FILE_COUNT = 8
+    BENCHMARK_FILE_SIZE = 16 * 1024 * 1024
+    line = b"Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.\n"
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for number in range(BENCHMARK_FILE_COUNT):
+            path = os.path.join(temp_dir, f"018_flat_file_{number}.txt")
+            with open(path, "wb") as f:
+                f.write(line * (BENCHMARK_FILE_SIZE // len(line)))
+            paths.append(path)
+        total_mb = BENCHMARK_FILE_COUNT * BENCHMARK_FILE_SIZE / (1024 * 1024)
+
+        expected = None
+        for max_workers in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            results = process_files(paths, max_workers=max_workers)
+            elapsed = time.perf_counter() - start
+            merged = merge_results(results)
+            expected = expected or merged
+            assert merged == expected
+            print(f"{max_workers} workers : {elapsed:.3f} sec, {total_mb / elapsed:.1f} MB/s")
+            worker_report(results)
+            print()
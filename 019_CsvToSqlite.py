@@ -0,0 +1,334 @@
+# plan.txt describes a project that handles csv, json and Excel files with pandas.
+# The only place data is stored so far is the sqlite3 user table of 006_Sqlite3BasicUsage.py.
+# In this file, I will load a CSV file into sqlite3.
+
+# The steps are as follows.
+# 1. A sample of rows is read first, and the type of every column is guessed from it.
+#    The types are the sqlite3 types listed in 006_Sqlite3BasicUsage.py.
+#    INTEGER : every value is a whole number.
+#    REAL : every value is a number and at least one has a decimal point or an exponent.
+#    NUMERIC : whole numbers and decimals are mixed. NUMERIC keeps 3 as an integer and 3.5 as a real,
+#              while REAL would turn 3 into 3.0.
+#    BLOB : every value is a hex literal like X'48656C6C6F'.
+#    TEXT : anything else. Numbers with leading zeros such as zip codes also stay TEXT,
+#           because converting "007" to 7 loses data.
+#    Empty values are stored as NULL and do not affect the guess.
+# 2. The table is created from the guessed types.
+# 3. The file is read in chunks, converted, and inserted with executemany in large transactions.
+
+# If pandas is installed, the conversion can be done by pandas instead.
+# pandas converts a whole column at once in C code, which is faster for wide files.
+# It is optional, and the standard library path works without it.
+
+import csv
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from itertools import chain, islice
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+SAMPLE_SIZE = 1000
+CHUNK_SIZE = 50_000
+CHUNKS_PER_TRANSACTION = 10
+READ_BUFFER_SIZE = 1024 * 1024
+
+# ====================================================================================================
+
+# Type inference
+INTEGER_PATTERN = re.compile(r"[+-]?(0|[1-9][0-9]*)")
+REAL_PATTERN = re.compile(r"[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?")
+BLOB_PATTERN = re.compile(r"[xX]'([0-9a-fA-F]{2})*'")
+LEADING_ZERO_PATTERN = re.compile(r"[+-]?0[0-9]")
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+def fits_int64(value):
+    # Up to 18 digits always fit, so int() is needed only for the rare long values.
+    return len(value) < 19 or INT64_MIN <= int(value) <= INT64_MAX
+
+# A whole number too large for sqlite3 INTEGER is TEXT, because binding it would raise OverflowError
+# and storing it as REAL would lose digits.
+def infer_value_type(value):
+    if INTEGER_PATTERN.fullmatch(value):
+        return "INTEGER" if fits_int64(value) else "TEXT"
+    if REAL_PATTERN.fullmatch(value) and not LEADING_ZERO_PATTERN.match(value):
+        return "REAL"
+    if BLOB_PATTERN.fullmatch(value):
+        return "BLOB"
+    return "TEXT"
+
+def infer_column_types(rows, column_count):
+    found = [set() for _ in range(column_count)]
+    for row in rows:
+        for index, value in enumerate(row[:column_count]):
+            if value != "":
+                found[index].add(infer_value_type(value))
+    types = []
+    for kinds in found:
+        if kinds == {"INTEGER"}:
+            types.append("INTEGER")
+        elif kinds == {"REAL"}:
+            types.append("REAL")
+        elif kinds == {"INTEGER", "REAL"}:
+            types.append("NUMERIC")
+        elif kinds == {"BLOB"}:
+            types.append("BLOB")
+        else:
+            types.append("TEXT")
+    return types
+
+# Converters
+# Each column gets one function that turns the text into the Python value for its type.
+# The function is chosen once per column, not once per value.
+def to_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+CONVERTERS = {
+    "INTEGER": int,
+    "REAL": float,
+    "NUMERIC": to_number,
+    "BLOB": lambda value: bytes.fromhex(value[2:-1]),
+    "TEXT": str,
+}
+
+# The type is guessed from a sample, so a later value may not fit it.
+# Such a value is stored as text, which sqlite3 allows in a column of any type.
+# A value is converted only if it is written the way the type was guessed.
+# int() and float() alone would also take "1_000", " 12 " or "inf", and those would not come back as written.
+# A whole number outside the 64-bit range of sqlite3 INTEGER does not fit either, so it is passed as text too.
+# (In an INTEGER or NUMERIC column, sqlite3 itself still stores such text as a REAL by type affinity.)
+def is_integer(value):
+    return INTEGER_PATTERN.fullmatch(value) is not None and fits_int64(value)
+
+def is_number(value):
+    if INTEGER_PATTERN.fullmatch(value):
+        return fits_int64(value)
+    return REAL_PATTERN.fullmatch(value) is not None and not LEADING_ZERO_PATTERN.match(value)
+
+def is_real(value):
+    return REAL_PATTERN.fullmatch(value) is not None and not LEADING_ZERO_PATTERN.match(value)
+
+MATCHERS = {
+    "INTEGER": is_integer,
+    "REAL": is_real,
+    "NUMERIC": is_number,
+    "BLOB": BLOB_PATTERN.fullmatch,
+}
+
+def keep_text_on_mismatch(tp):
+    converter, matches = CONVERTERS[tp], MATCHERS[tp]
+    def convert(value):
+        if matches(value):
+            return converter(value)
+        return value
+    return convert
+
+def make_row_converter(types):
+    converters = [CONVERTERS[tp] if tp == "TEXT" else keep_text_on_mismatch(tp) for tp in types]
+    column_count = len(converters)
+
+    def convert(row):
+        # Short rows are filled with NULL, and extra values are ignored.
+        row = row[:column_count] + [""] * (column_count - len(row))
+        return tuple(None if value == "" else converter(value) for converter, value in zip(converters, row))
+    return convert
+
+# ====================================================================================================
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def create_table(conn, table, header, types):
+    columns = ", ".join(f"{quote_identifier(name)} {tp}" for name, tp in zip(header, types))
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table)} ({columns})")
+
+def insert_chunks(conn, table, column_count, chunks):
+    placeholders = ", ".join("?" * column_count)
+    sql = f"INSERT INTO {quote_identifier(table)} VALUES ({placeholders})"
+    total = 0
+    for number, chunk in enumerate(chunks, 1):
+        conn.executemany(sql, chunk)
+        total += len(chunk)
+        if number % CHUNKS_PER_TRANSACTION == 0:
+            conn.commit()
+    conn.commit()
+    return total
+
+# Standard library path
+def load_csv(conn, csv_path, table, encoding="utf-8", delimiter=","):
+    with open(csv_path, "r", encoding=encoding, newline="", buffering=READ_BUFFER_SIZE) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        sample = list(islice(reader, SAMPLE_SIZE))
+        types = infer_column_types(sample, len(header))
+        create_table(conn, table, header, types)
+        convert = make_row_converter(types)
+
+        def chunks():
+            rows = chain(sample, reader)
+            while True:
+                chunk = [convert(row) for row in islice(rows, CHUNK_SIZE)]
+                if not chunk:
+                    return
+                yield chunk
+
+        return types, insert_chunks(conn, table, len(header), chunks())
+
+# pandas path
+# The types are still guessed by infer_column_types, so both paths create the same table.
+# Every column is read as text and converted with pandas for the guessed type.
+# The rows for executemany are still built one by one with itertuples.
+# As in the standard library path, only the values that match the type are converted,
+# and the others keep their original text.
+# Numbers are converted with pd.to_numeric, whole numbers and decimals separately,
+# so a whole number becomes an exact int64 instead of a rounded float64.
+def matching_values(column, tp):
+    if tp == "BLOB":
+        return [column.str.fullmatch(BLOB_PATTERN.pattern, na=False)]
+    whole = column.str.fullmatch(INTEGER_PATTERN.pattern, na=False)
+    real = (column.str.fullmatch(REAL_PATTERN.pattern, na=False)
+            & ~column.str.match(LEADING_ZERO_PATTERN.pattern, na=False) & ~whole)
+    long = whole & (column.str.len() >= 19)
+    if long.any():
+        whole[long] = column[long].map(fits_int64).astype(bool)
+    if tp == "INTEGER":
+        return [whole]
+    if tp == "REAL":
+        return [whole | real]
+    return [whole, real]
+
+def load_csv_with_pandas(conn, csv_path, table, encoding="utf-8", delimiter=","):
+    if pd is None:
+        raise ImportError("pandas is required for load_csv_with_pandas")
+    with open(csv_path, "r", encoding=encoding, newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        types = infer_column_types(islice(reader, SAMPLE_SIZE), len(header))
+    create_table(conn, table, header, types)
+
+    def convert(frame):
+        for name, tp in zip(header, types):
+            column = frame[name]
+            values = column.astype(object).where(column.notna(), None)
+            if tp == "TEXT":
+                frame[name] = values
+                continue
+            for matched in matching_values(column, tp):
+                if not matched.any():
+                    continue
+                if tp == "BLOB":
+                    # pandas has no hex decoder for a column, so BLOB values are decoded one by one.
+                    values[matched] = column[matched].map(CONVERTERS["BLOB"])
+                    continue
+                numbers = pd.to_numeric(column[matched])
+                if tp == "REAL":
+                    numbers = numbers.astype("float64")
+                # tolist() gives Python numbers, which sqlite3 can bind, instead of NumPy scalars.
+                values[matched] = pd.Series(numbers.tolist(), index=numbers.index, dtype=object)
+            frame[name] = values
+        return list(frame.itertuples(index=False, name=None))
+
+    frames = pd.read_csv(csv_path, sep=delimiter, encoding=encoding, dtype=str,
+                         keep_default_na=False, na_values=[""], chunksize=CHUNK_SIZE)
+    return types, insert_chunks(conn, table, len(header), (convert(frame) for frame in frames))
+
+# ====================================================================================================
+
+# Let's load a small CSV file with every type.
+sample_csv = """id,name,email,zipcode,score,ratio,photo,regdate
+1,Bonita,Bonita@example.com,01234,85,0.5,X'48656C6C6F',2020-07-07 12:00:00
+2,Bono,Bono@example.com,12345,90.5,1.25,,2020-07-07 12:00:00
+3,Belita,,00501,77,3e-2,X'',2020-07-07 12:00:00
+"""
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    csv_path = os.path.join(temp_dir, "019_users.csv")
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        f.write(sample_csv)
+
+    conn = sqlite3.connect(os.path.join(temp_dir, "019_database.db"))
+    types, total = load_csv(conn, csv_path, "user")
+    print(f"Loaded {total} rows")
+
+    print("\nTable Information")
+    for cid, name, tp, notnull, dflt_value, pk in conn.execute("pragma table_info(user)"):
+        print(f"cid:{cid}, name:{name}, type:{tp}, dflt_value:{dflt_value}, pk:{pk}")
+
+    print("\nAll User List")
+    for data in conn.execute("SELECT * FROM user"):
+        print(data)
+    conn.close()
+
+# A later value that does not fit the guessed type is kept as it was written.
+convert = make_row_converter(["INTEGER", "INTEGER", "REAL", "BLOB"])
+print(f"\n{convert(['12', '1_000', ' 12 ', 'X4G'])}")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# A synthetic CSV export is loaded with a commit per row, with the chunked loader,
+# and with pandas if it is installed.
+BENCHMARK_ROW_COUNT = 500_000
+PER_ROW_COUNT = 2_000
+
+def write_benchmark_csv(path, count):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "email", "score", "ratio", "regdate"])
+        for pk in range(count):
+            writer.writerow([pk, f"user{pk}", f"user{pk}@example.com", pk % 100, pk / 7, "2020-07-07 12:00:00"])
+
+def load_with_per_row_commit(conn, csv_path, table):
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        conn.execute(f"CREATE TABLE {table} ({', '.join(header)})")
+        total = 0
+        for row in reader:
+            conn.execute(f"INSERT INTO {table} VALUES ({', '.join('?' * len(row))})", row)
+            conn.commit()
+            total += 1
+    return None, total
+
+def measure(name, function, conn, csv_path):
+    start = time.perf_counter()
+    _, total = function(conn, csv_path, "user")
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+    print(f"{name:<16} {total:>8} rows {total / elapsed:>12.0f} rows/s {size_mb / elapsed:>8.1f} MB/s")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    small_csv_path = os.path.join(temp_dir, "small.csv")
+    write_benchmark_csv(small_csv_path, PER_ROW_COUNT)
+    conn = sqlite3.connect(os.path.join(temp_dir, "per_row.db"))
+    measure("per-row commit", load_with_per_row_commit, conn, small_csv_path)
+    conn.close()
+
+    csv_path = os.path.join(temp_dir, "large.csv")
+    write_benchmark_csv(csv_path, BENCHMARK_ROW_COUNT)
+    conn = sqlite3.connect(os.path.join(temp_dir, "chunked.db"))
+    measure("chunked", load_csv, conn, csv_path)
+    conn.close()
+
+    if pd is not None:
+        conn = sqlite3.connect(os.path.join(temp_dir, "pandas.db"))
+        measure("pandas", load_csv_with_pandas, conn, csv_path)
+        conn.close()
+    else:
+        print("pandas is not installed, so the pandas path is skipped.")
@@ -0,0 +1,177 @@
+# In 001_UsePrintFunction.py, every line is printed with its own print call,
+# file=f writes to 001_result.txt, and flush=True forces the output out immediately.
+# As explained there, pushing the buffer out is expensive.
+# When a reporting job prints every line with flush=True, most of the time is spent on that push.
+# In this file, I will make an output sink that collects records in a write buffer
+# and pushes them out only when it is worth it.
+
+# When is the buffer flushed?
+# Size : when the buffer has more than max_bytes characters.
+# Time : when flush_interval seconds have passed since the last flush.
+# Checkpoint : when checkpoint() is called, for example at the end of a report section.
+# close() flushes whatever is left.
+
+# Background writer
+# With background=True, a separate thread does the writing.
+# Producers only add the text to a queue, so they never wait for the disk or the console.
+# The sep and end parameters work the same as in print.
+
+import os
+import sys
+import tempfile
+import threading
+import time
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+# ====================================================================================================
+
+class OutputSink:
+    def __init__(self, file=None, max_bytes=64 * 1024, flush_interval=1.0, background=False):
+        self.file = file if file is not None else sys.stdout
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.background = background
+        self.flush_count = 0
+        # _pending_lock guards only the list of records and its size, and is held for a moment.
+        # The writing itself happens under _io_lock, so producers never wait for the disk or the console.
+        self._pending = []
+        self._pending_size = 0
+        self._pending_lock = threading.Lock()
+        self._next_flush = time.monotonic() + (flush_interval or 0)
+        self._closed = False
+        self._io_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._writer = None
+        if background:
+            self._writer = threading.Thread(target=self._write_in_background, daemon=True)
+            self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # The same as print(*objects, sep=sep, end=end, file=self.file), but buffered.
+    # As in print, None means the default separator and line end.
+    def write(self, *objects, sep=" ", end="\n"):
+        text = (" " if sep is None else sep).join(map(str, objects)) + ("\n" if end is None else end)
+        # The closed check and the append are done together, so no record is added after the final flush.
+        with self._pending_lock:
+            if self._closed:
+                raise ValueError("I/O operation on closed sink.")
+            self._pending.append(text)
+            self._pending_size += len(text)
+            full = self._pending_size >= self.max_bytes
+        if full or (self.flush_interval is not None and time.monotonic() >= self._next_flush):
+            if self.background:
+                if not self._wake_up.is_set():
+                    self._wake_up.set()
+            else:
+                self._flush()
+
+    def checkpoint(self):
+        self._flush()
+
+    def _flush(self):
+        with self._io_lock:
+            # Only the records that are there now are taken, and the size starts again from 0.
+            # Records added while writing stay for the next flush.
+            with self._pending_lock:
+                chunk, self._pending = self._pending, []
+                self._pending_size = 0
+            self._next_flush = time.monotonic() + (self.flush_interval or 0)
+            if chunk:
+                self.file.write("".join(chunk))
+                self.file.flush()
+                self.flush_count += 1
+
+    def _write_in_background(self):
+        while not self._closed:
+            self._wake_up.wait(self.flush_interval)
+            self._wake_up.clear()
+            self._flush()
+
+    def close(self):
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._writer is not None:
+            self._wake_up.set()
+            self._writer.join()
+        self._flush()
+
+# ====================================================================================================
+
+# Let's print the examples of 001_UsePrintFunction.py through the sink.
+with OutputSink() as sink:
+    sink.write('T', 'E', 'S', 'T')
+    sink.write('T', 'E', 'S', 'T', sep='')
+    sink.write('2019', '02', '19', sep='-')
+    sink.write('codeengrarver', 'gmail.com', sep='@')
+    sink.write('Welcome To', end=' ')
+    sink.write('Python world!', end=' ')
+    sink.write("You're gonna love it.", sep=None, end=None)
+    # Nothing has been printed yet. checkpoint() pushes everything out at once.
+    sink.checkpoint()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    result_path = os.path.join(temp_dir, "001_result.txt")
+    with open(result_path, "w") as f:
+        with OutputSink(f, background=True) as sink:
+            sink.write("It's written to the file.")
+    with open(result_path) as f:
+        print(f.read(), end="")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Report lines are written to a file with print(..., flush=True) as in 001_UsePrintFunction.py,
+# with plain print, and with the sink in both modes.
+# A local file is fast, so the background writer mostly competes with the producer for the GIL here.
+# It pays off when the output is slow, such as a console or a network drive.
+BENCHMARK_LINE_COUNT = 200_000
+
+def use_print_flush(f):
+    for number in range(BENCHMARK_LINE_COUNT):
+        print("report line", number, "ok", sep=",", file=f, flush=True)
+
+def use_print(f):
+    for number in range(BENCHMARK_LINE_COUNT):
+        print("report line", number, "ok", sep=",", file=f)
+
+def use_sink(f):
+    with OutputSink(f) as sink:
+        for number in range(BENCHMARK_LINE_COUNT):
+            sink.write("report line", number, "ok", sep=",")
+
+def use_background_sink(f):
+    with OutputSink(f, background=True) as sink:
+        for number in range(BENCHMARK_LINE_COUNT):
+            sink.write("report line", number, "ok", sep=",")
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    expected = None
+    for name, function in (
+        ("print flush=True", use_print_flush),
+        ("print", use_print),
+        ("OutputSink", use_sink),
+        ("OutputSink background", use_background_sink),
+    ):
+        path = os.path.join(temp_dir, "report.txt")
+        with open(path, "w") as f:
+            start = time.perf_counter()
+            function(f)
+            elapsed = time.perf_counter() - start
+        with open(path) as f:
+            content = f.read()
+        expected = expected or content
+        assert content == expected
+        print(f"{name:<24} {BENCHMARK_LINE_COUNT / elapsed:>12.0f} lines/s")
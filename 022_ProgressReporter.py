@@ -0,0 +1,213 @@
+# 004_AboutCarriageReturn.py redraws one status line with print_time_one_line and end='\r',
+# and it sleeps a full second between updates.
+# In a long-running ingestion job, the hot loop cannot print or sleep on every record.
+# Printing millions of lines per second would be slower than the job itself.
+# In this file, I will separate counting from drawing.
+
+# Counting
+# Each worker thread gets its own counter and only adds to it.
+# Nobody else writes to that counter, so no lock is needed, and an addition costs almost nothing.
+# For processes, a shared array is used in the same way, one slot per process.
+# Drawing
+# A separate thread wakes up refresh_rate times per second, sums the counters,
+# and redraws the line with '\r' as in 004_AboutCarriageReturn.py.
+# The rate is smoothed with an exponential moving average,
+# so the line does not jump around when the speed changes a little.
+# If the total amount of work is known, the ETA is shown as well.
+
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import time
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+# ====================================================================================================
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, amount=1):
+        self.value += amount
+
+class ProgressReporter:
+    def __init__(self, total=None, refresh_rate=4, smoothing=0.3, file=None, label="Progress"):
+        self.total = total
+        self.refresh_interval = 1 / refresh_rate
+        self.smoothing = smoothing
+        self.file = file if file is not None else sys.stdout
+        self.label = label
+        self.rate = None
+        self._counters = []
+        self._counters_lock = threading.Lock()
+        self._local = threading.local()
+        self._shared_slots = None
+        self._stop = threading.Event()
+        self._drawer = None
+        self._started = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def counter(self):
+        # Each thread gets its own Counter the first time it asks for one.
+        # The lock is taken only then, not for every addition.
+        counter = getattr(self._local, "counter", None)
+        if counter is None:
+            counter = Counter()
+            with self._counters_lock:
+                self._counters.append(counter)
+            self._local.counter = counter
+        return counter
+
+    def shared_slots(self, count):
+        # lock=False is safe because every process writes only its own slot.
+        self._shared_slots = multiprocessing.Array("q", count, lock=False)
+        return self._shared_slots
+
+    def done(self):
+        total = sum(counter.value for counter in self._counters)
+        if self._shared_slots is not None:
+            total += sum(self._shared_slots)
+        return total
+
+    def start(self):
+        self._started = time.monotonic()
+        self._drawer = threading.Thread(target=self._draw_periodically, daemon=True)
+        self._drawer.start()
+
+    # Stopping a reporter that was never started does nothing, as there is nothing to draw.
+    def stop(self):
+        if self._started is None:
+            return
+        self._stop.set()
+        if self._drawer is not None:
+            self._drawer.join()
+        self.draw(time.monotonic(), final=True)
+
+    def _draw_periodically(self):
+        last_time, last_done = self._started, 0
+        while not self._stop.wait(self.refresh_interval):
+            now = time.monotonic()
+            done = self.done()
+            current_rate = (done - last_done) / (now - last_time)
+            if self.rate is None:
+                self.rate = current_rate
+            else:
+                self.rate = self.smoothing * current_rate + (1 - self.smoothing) * self.rate
+            last_time, last_done = now, done
+            self.draw(now)
+
+    def draw(self, now, final=False):
+        done = self.done()
+        elapsed = now - self._started
+        rate = (done / elapsed if elapsed else 0.0) if final or self.rate is None else self.rate
+        line = f"{self.label} : {done:,}"
+        if self.total:
+            line += f"/{self.total:,} ({done / self.total:6.1%})"
+        line += f" | {rate:,.0f}/s | elapsed {elapsed:6.1f}s"
+        if self.total and not final and rate > 0:
+            line += f" | ETA {max(0, self.total - done) / rate:6.1f}s"
+        # Spaces at the end erase the rest of a longer previous line.
+        self.file.write(f"\r{line:<100}" + ("\n" if final else ""))
+        self.file.flush()
+
+# ====================================================================================================
+
+# Worker for the multiprocessing example. It must be a top-level function so that it can be pickled.
+def count_in_process(slots, index, amount):
+    for _ in range(amount // 1000):
+        slots[index] += 1000
+
+if __name__ == "__main__":
+    # Let's do the countdown of 004_AboutCarriageReturn.py with a reporter.
+    # Four threads do the work, and the main thread never prints anything.
+    WORK_PER_THREAD = 2_000_000
+
+    def work(reporter):
+        counter = reporter.counter()
+        for _ in range(WORK_PER_THREAD):
+            counter.add()
+
+    with ProgressReporter(total=4 * WORK_PER_THREAD, label="Threads") as reporter:
+        threads = [threading.Thread(target=work, args=(reporter,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Processes add to their own slot of the shared array.
+    with ProgressReporter(total=4 * WORK_PER_THREAD, label="Processes") as reporter:
+        slots = reporter.shared_slots(4)
+        processes = [
+            multiprocessing.Process(target=count_in_process, args=(slots, index, WORK_PER_THREAD))
+            for index in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    result_delimiter()
+
+    # Benchmark
+    # The cost of one update is measured in nanoseconds.
+    # An empty loop is the baseline. The others are a lock-protected shared counter,
+    # the Counter of this file while the reporter is drawing,
+    # and printing the line on every update as print_time_one_line does (with fewer updates).
+    BENCHMARK_UPDATE_COUNT = 5_000_000
+    PRINT_UPDATE_COUNT = 50_000
+
+    def measure(name, function, count):
+        start = time.perf_counter()
+        function(count)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22} {elapsed / count * 1e9:>8.1f} ns/update {count / elapsed:>14,.0f} updates/s")
+
+    def empty_loop(count):
+        for _ in range(count):
+            pass
+
+    lock = threading.Lock()
+    shared = [0]
+    def locked_counter(count):
+        for _ in range(count):
+            with lock:
+                shared[0] += 1
+
+    def reporter_counter(count):
+        with ProgressReporter(total=count, file=io.StringIO(), refresh_rate=10) as reporter:
+            counter = reporter.counter()
+            for _ in range(count):
+                counter.add()
+        assert reporter.done() == count
+
+    def reporter_counter_inline(count):
+        # In the hottest loops, even the method call can be skipped.
+        with ProgressReporter(total=count, file=io.StringIO(), refresh_rate=10) as reporter:
+            counter = reporter.counter()
+            for _ in range(count):
+                counter.value += 1
+
+    def print_every_update(count):
+        with open(os.devnull, "w") as f:
+            for number in range(count):
+                print('Time Remaining: %d' % number, end='\r', file=f, flush=True)
+
+    measure("empty loop", empty_loop, BENCHMARK_UPDATE_COUNT)
+    measure("lock + shared int", locked_counter, BENCHMARK_UPDATE_COUNT)
+    measure("Counter.add()", reporter_counter, BENCHMARK_UPDATE_COUNT)
+    measure("Counter.value += 1", reporter_counter_inline, BENCHMARK_UPDATE_COUNT)
+    measure("print every update", print_every_update, PRINT_UPDATE_COUNT)
@@ -0,0 +1,407 @@
+# None of the helpers in this repository say how long they take
+# or how many bytes and rows they move.
+# get_path, show_select_all, show_select_one and the read, write and seek sections
+# just run, and when a nightly job becomes slow there is nothing to look at.
+# In this file, I will make a small instrumentation layer.
+
+# What is measured
+# Timers : how many times a function was called, and the total, minimum and maximum time.
+# Counters : bytes read and written, rows fetched, commits, sqlite3 virtual machine steps.
+# Statements : how many times each SQL statement was executed and how long execute took
+#              (until the first row is ready), measured by wrapping the cursor's execute.
+#              Fetching the rest of the rows is counted in rows, not in the statement time.
+# sqlite3 : set_trace_callback counts every statement sqlite3 starts, including the BEGIN that
+#           Python adds, and set_progress_handler counts the virtual machine steps. Neither one gives a duration.
+# At exit, a summary table is printed, and the same numbers are saved as JSON.
+
+# Cost when disabled
+# The instrumentation is switched off with the environment variable INSTRUMENT=0.
+# Then instrument() returns the original function, instrumented_open() returns a plain file,
+# and connect() returns a plain connection, so nothing is added to the hot path at all.
+
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+class Timer:
+    __slots__ = ("count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed < self.minimum:
+            self.minimum = elapsed
+        if elapsed > self.maximum:
+            self.maximum = elapsed
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "min_ms": self.minimum * 1000 if self.count else 0.0,
+            "max_ms": self.maximum * 1000,
+        }
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timers = defaultdict(Timer)
+        self.counters = defaultdict(int)
+        # The Timer of each raw SQL string, so a statement is normalized only the first time it runs.
+        self.statement_timers = {}
+
+    def statement_timer(self, prefix, sql):
+        timer = self.statement_timers.get((prefix, sql))
+        if timer is None:
+            timer = self.statement_timers[prefix, sql] = self.timers[f"{prefix}: {normalize_sql(sql)}"]
+        return timer
+
+    def summary(self):
+        return {
+            "timers": {name: timer.as_dict() for name, timer in sorted(self.timers.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def print_summary(self, file=None):
+        summary = self.summary()
+        print(f"{'name':<60} {'count':>8} {'total ms':>10} {'mean ms':>10} {'max ms':>10}", file=file)
+        for name, timer in summary["timers"].items():
+            print(f"{name[:60]:<60} {timer['count']:>8} {timer['total_ms']:>10.3f} "
+                  f"{timer['mean_ms']:>10.4f} {timer['max_ms']:>10.3f}", file=file)
+        print(file=file)
+        for name, value in summary["counters"].items():
+            print(f"{name:<60} {value:>12}", file=file)
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    # Measurements made inside the with block go to empty collections,
+    # and the collections from before are put back after it.
+    # The Metrics object itself stays the same, so code that holds on to it keeps reporting into it.
+    @contextmanager
+    def separate(self):
+        saved = self.timers, self.counters, self.statement_timers
+        self.timers, self.counters, self.statement_timers = defaultdict(Timer), defaultdict(int), {}
+        try:
+            yield self
+        finally:
+            self.timers, self.counters, self.statement_timers = saved
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+        self.statement_timers.clear()
+
+metrics = Metrics(enabled=os.environ.get("INSTRUMENT", "1") != "0")
+
+# ====================================================================================================
+
+# Function timers
+def instrument(name=None):
+    def decorator(function):
+        if not metrics.enabled:
+            return function
+        timer = metrics.timers[name or function.__qualname__]
+        perf_counter = time.perf_counter
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timer.add(perf_counter() - start)
+        return wrapper
+    return decorator
+
+# File handles
+# The proxy counts the bytes (or characters in text mode) that go through read and write.
+class InstrumentedFile:
+    def __init__(self, handle, name):
+        self._handle = handle
+        self._read = f"{name}.read"
+        self._written = f"{name}.written"
+
+    def __getattr__(self, attribute):
+        return getattr(self._handle, attribute)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._handle.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._handle)
+        metrics.counters[self._read] += len(line)
+        return line
+
+    def read(self, size=-1):
+        data = self._handle.read(size)
+        metrics.counters[self._read] += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self._handle.readline(size)
+        metrics.counters[self._read] += len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        lines = self._handle.readlines(hint)
+        metrics.counters[self._read] += sum(map(len, lines))
+        return lines
+
+    def write(self, data):
+        written = self._handle.write(data)
+        metrics.counters[self._written] += written
+        return written
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def seek(self, offset, whence=0):
+        metrics.counters["file.seeks"] += 1
+        return self._handle.seek(offset, whence)
+
+def instrumented_open(file, mode="r", *args, **kwargs):
+    if not metrics.enabled:
+        return open(file, mode, *args, **kwargs)
+    start = time.perf_counter()
+    handle = open(file, mode, *args, **kwargs)
+    metrics.timers["file.open"].add(time.perf_counter() - start)
+    unit = "bytes" if "b" in mode else "chars"
+    return InstrumentedFile(handle, f"file.{unit}")
+
+# ====================================================================================================
+
+# sqlite3
+# InstrumentedConnection and InstrumentedCursor time every execute, fetch and commit.
+# set_trace_callback receives the SQL text of every statement sqlite3 runs,
+# including the ones that Python runs for us such as BEGIN.
+# set_progress_handler calls our function every PROGRESS_STEPS virtual machine instructions,
+# which tells how much work a statement really did.
+PROGRESS_STEPS = 1000
+
+def normalize_sql(sql):
+    return " ".join(sql.split())
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.statement_timer("sql", sql).add(time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            metrics.statement_timer("sql many", sql).add(time.perf_counter() - start)
+
+    # Rows read with "for row in cursor" are counted too.
+    def __next__(self):
+        row = super().__next__()
+        metrics.counters["sqlite.rows_fetched"] += 1
+        return row
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.counters["sqlite.rows_fetched"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.counters["sqlite.rows_fetched"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.counters["sqlite.rows_fetched"] += len(rows)
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        super().commit()
+        metrics.timers["sqlite.commit"].add(time.perf_counter() - start)
+        metrics.counters["sqlite.commits"] += 1
+
+def trace_statement(statement):
+    metrics.counters["sqlite.statements_started"] += 1
+
+def count_progress():
+    metrics.counters["sqlite.vm_steps"] += PROGRESS_STEPS
+    # Returning a true value would abort the statement.
+    return 0
+
+def connect(database, **kwargs):
+    if not metrics.enabled:
+        return sqlite3.connect(database, **kwargs)
+    conn = sqlite3.connect(database, factory=InstrumentedConnection, **kwargs)
+    conn.set_trace_callback(trace_statement)
+    conn.set_progress_handler(count_progress, PROGRESS_STEPS)
+    return conn
+
+# ====================================================================================================
+
+# Export at exit
+# The summary is saved only when something was measured.
+METRICS_PATH = get_path("result_files", "023_metrics.json")
+
+def export_at_exit():
+    if metrics.enabled and (metrics.timers or metrics.counters):
+        metrics.export_json(METRICS_PATH)
+
+atexit.register(export_at_exit)
+
+# ====================================================================================================
+
+# Let's wrap the helpers of 005_AboutOpenFunction.py and 006_Sqlite3BasicUsage.py.
+get_path = instrument("get_path")(get_path)
+
+@instrument("read, write and seek sections")
+def read_write_seek(temp_dir):
+    with instrumented_open(get_path("datasets", "005_text.txt"), "r") as f:
+        f.read()
+    with instrumented_open(get_path("datasets", "005_text.txt"), "r") as f:
+        for line in f:
+            pass
+    with instrumented_open(os.path.join(temp_dir, "005_write_ex.txt"), "w", encoding="utf-8") as f:
+        f.write("'w' mode overwrites files.\n")
+        f.writelines(["tennis, ", "soccer, ", "baseball\n"])
+    with instrumented_open(os.path.join(temp_dir, "005_write_ex.txt"), "rb") as f:
+        f.seek(5)
+        f.read()
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    read_write_seek(temp_dir)
+
+    conn = connect(os.path.join(temp_dir, "023_database.db"))
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    cur.executemany("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(1, 10_001)))
+    conn.commit()
+
+    @instrument("show_select_all")
+    def show_select_all(msg="\nAll User List"):
+        cur.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+        """)
+        print(msg, len(cur.fetchall()), "rows")
+
+    @instrument("show_select_one")
+    def show_select_one(pk, msg="\nOne User"):
+        cur.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE id = ?
+        """, (pk,))
+        print(msg)
+        print(cur.fetchone())
+
+    show_select_all()
+    show_select_one(2)
+    cur.execute("""
+        UPDATE user
+        SET name = :name, email = :name || '@example.com'
+        WHERE id = :id
+    """, {"name":"Emma", "id":3})
+    conn.commit()
+    show_select_one(3, "After Update")
+    conn.close()
+
+print()
+metrics.print_summary()
+print(f"\nThe summary will be saved to {os.path.relpath(METRICS_PATH, BASE_DIR)} at exit.")
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The cost of the wrapper is measured on an empty function and on a primary key lookup.
+# "disabled" is what instrument() returns when INSTRUMENT=0, which is the function itself.
+# The benchmark is not part of the job, so its numbers are collected apart
+# and the metrics of the job are put back for the export at exit.
+BENCHMARK_CALL_COUNT = 200_000
+
+def empty_function():
+    pass
+
+def measure(name, function, count=BENCHMARK_CALL_COUNT):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {elapsed / count * 1e9:>10.1f} ns/call")
+
+with metrics.separate(), tempfile.TemporaryDirectory() as temp_dir:
+    measure("empty function, disabled", empty_function)
+    measure("empty function, enabled", instrument("benchmark.empty")(empty_function))
+
+    database = os.path.join(temp_dir, "023_benchmark.db")
+    plain_conn = sqlite3.connect(database)
+    plain_conn.execute("CREATE TABLE user(id INTEGER PRIMARY KEY, name TEXT, email TEXT, regdate TEXT)")
+    plain_conn.executemany("INSERT INTO user VALUES (?, ?, ?, ?)",
+                           ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(1000)))
+    plain_conn.commit()
+    instrumented_conn = connect(database)
+
+    def lookup(conn):
+        return lambda: conn.execute("SELECT id, name, email, regdate FROM user WHERE id = ?", (7,)).fetchone()
+
+    measure("select one, disabled", lookup(plain_conn))
+    measure("select one, enabled", lookup(instrumented_conn))
+    plain_conn.close()
+    instrumented_conn.close()
@@ -0,0 +1,261 @@
+# 005_AboutOpenFunction.py documents every mode of open (r, rb, r+, w, wb, w+, a, ab, a+)
+# and the values of buffering (0, 1, N, -1), but it gives no numbers on how they perform.
+# In this file, I will make a benchmark harness, so that buffer sizes are chosen with data.
+
+# What the harness does
+# 1. Synthetic datasets are generated from KB to GB size with a fixed random seed,
+#    so every run measures exactly the same bytes.
+# 2. Read, write, append and seek throughput are measured for each mode, buffer size and newline setting.
+#    read(), readline(), iteration and readlines() are compared as well.
+# 3. Every case is repeated, and the best time is kept, because the best time has the least noise.
+# 4. The results are saved as JSON, and compared with a stored baseline.
+#    Cases that became slower than the threshold are reported as regressions.
+
+# How to use
+#   python 024_FileModeBenchmark.py                          : measure and compare with the baseline
+#   python 024_FileModeBenchmark.py --save-baseline          : measure and store the result as the baseline
+#   python 024_FileModeBenchmark.py --sizes 1KB 64MB 1GB     : choose the dataset sizes
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+RESULT_PATH = get_path("result_files", "024_benchmark.json")
+BASELINE_PATH = get_path("result_files", "024_baseline.json")
+DEFAULT_SIZES = ("64KB", "8MB")
+REPEAT = 3
+SEEK_COUNT = 2000
+SEEK_READ_SIZE = 64
+REGRESSION_THRESHOLD = 0.10
+
+TEXT_BUFFERINGS = (1, 4096, 65536, 1024 * 1024, -1)
+BINARY_BUFFERINGS = (0, 4096, 65536, 1024 * 1024, -1)
+NEWLINES = (None, "", "\n", "\r\n")
+
+# ====================================================================================================
+
+# Datasets
+# Lines of random words from a fixed vocabulary, written in binary so the size is exact.
+WORDS = ("python", "open", "file", "buffer", "flush", "seek", "tell", "mode", "read", "write",
+         "append", "binary", "text", "encoding", "newline", "sqlite3")
+
+def parse_size(text):
+    match = re.fullmatch(r"([0-9]+)\s*(B|KB|MB|GB)?", text.strip().upper())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"Invalid size : {text}")
+    units = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, None: 1}
+    return int(match.group(1)) * units[match.group(2)]
+
+def make_dataset(path, size, seed=24):
+    generator = random.Random(seed)
+    block = bytearray()
+    while len(block) < min(size, 1024 * 1024):
+        block += (" ".join(generator.choice(WORDS) for _ in range(generator.randint(4, 16))) + "\n").encode()
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            part = block[:size - written]
+            f.write(part)
+            written += len(part)
+
+# ====================================================================================================
+
+# Cases
+# Every case is a function that does the work once and returns the number of bytes it moved.
+def read_case(path, mode, buffering, newline=None, method="read"):
+    def run():
+        kwargs = {"buffering": buffering}
+        if "b" not in mode:
+            kwargs.update(encoding="utf-8", newline=newline)
+        with open(path, mode, **kwargs) as f:
+            if method == "read":
+                return len(f.read())
+            if method == "readline":
+                total = 0
+                while True:
+                    line = f.readline()
+                    if not line:
+                        return total
+                    total += len(line)
+            if method == "iteration":
+                return sum(len(line) for line in f)
+            if method == "readlines":
+                return sum(map(len, f.readlines()))
+            raise ValueError(f"Unknown method : {method}")
+    return run
+
+# The lines are written repeat times, so a GB dataset does not have to be held in memory.
+# The file is emptied before every run, outside the timed part,
+# so every mode (including the append modes) writes the same bytes into an empty file.
+def write_case(path, mode, buffering, lines, repeat, newline=None):
+    binary_lines = [line.encode() for line in lines]
+    def prepare():
+        open(path, "wb").close()
+    def run():
+        kwargs = {"buffering": buffering}
+        if "b" not in mode:
+            kwargs.update(encoding="utf-8", newline=newline)
+        with open(path, mode, **kwargs) as f:
+            # Writing line by line shows the effect of the buffer size.
+            for _ in range(repeat):
+                for line in (binary_lines if "b" in mode else lines):
+                    f.write(line)
+        return sum(map(len, binary_lines)) * repeat
+    run.prepare = prepare
+    return run
+
+def seek_case(path, mode, buffering, size):
+    generator = random.Random(size)
+    offsets = [generator.randrange(max(1, size - SEEK_READ_SIZE)) for _ in range(SEEK_COUNT)]
+    def run():
+        kwargs = {"buffering": buffering}
+        if "b" not in mode:
+            kwargs.update(encoding="utf-8", errors="ignore")
+        total = 0
+        with open(path, mode, **kwargs) as f:
+            for offset in offsets:
+                # Text handles accept only offsets from tell(), so text seeks are done through the byte buffer.
+                target = f if "b" in mode else f.buffer
+                target.seek(offset)
+                total += len(target.read(SEEK_READ_SIZE))
+        return total
+    return run
+
+def build_cases(temp_dir, size_name, size):
+    data_path = os.path.join(temp_dir, f"data_{size_name}.txt")
+    make_dataset(data_path, size)
+    with open(data_path, "r", encoding="utf-8", newline="") as f:
+        lines = f.readlines(1024 * 1024)
+    repeat = max(1, size // sum(len(line) for line in lines))
+    cases = {}
+
+    for mode in ("r", "r+"):
+        for buffering in TEXT_BUFFERINGS:
+            if buffering == 1:
+                continue
+            cases[f"read/{mode}/buffering={buffering}"] = read_case(data_path, mode, buffering)
+    for mode in ("rb", "r+b"):
+        for buffering in BINARY_BUFFERINGS:
+            cases[f"read/{mode}/buffering={buffering}"] = read_case(data_path, mode, buffering)
+    for newline in NEWLINES:
+        cases[f"read/r/newline={newline!r}"] = read_case(data_path, "r", -1, newline)
+    for method in ("read", "readline", "iteration", "readlines"):
+        cases[f"method/r/{method}"] = read_case(data_path, "r", -1, method=method)
+        cases[f"method/rb/{method}"] = read_case(data_path, "rb", -1, method=method)
+
+    write_path = os.path.join(temp_dir, f"write_{size_name}.txt")
+    for mode in ("w", "w+", "a", "a+"):
+        for buffering in TEXT_BUFFERINGS:
+            cases[f"write/{mode}/buffering={buffering}"] = write_case(write_path, mode, buffering, lines, repeat)
+    for mode in ("wb", "wb+", "ab", "ab+"):
+        for buffering in BINARY_BUFFERINGS:
+            cases[f"write/{mode}/buffering={buffering}"] = write_case(write_path, mode, buffering, lines, repeat)
+    for newline in NEWLINES:
+        cases[f"write/w/newline={newline!r}"] = write_case(write_path, "w", -1, lines, repeat, newline)
+
+    for mode in ("rb", "r+b"):
+        for buffering in BINARY_BUFFERINGS:
+            cases[f"seek/{mode}/buffering={buffering}"] = seek_case(data_path, mode, buffering, size)
+    cases["seek/r/buffering=-1"] = seek_case(data_path, "r", -1, size)
+    return cases
+
+# ====================================================================================================
+
+# Measuring
+def measure(run, repeat=REPEAT):
+    best = float("inf")
+    moved = 0
+    prepare = getattr(run, "prepare", None)
+    for _ in range(repeat):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        moved = run()
+        best = min(best, time.perf_counter() - start)
+    return {"seconds": best, "bytes": moved, "mb_per_s": moved / (1024 * 1024) / best if best else 0.0}
+
+def run_benchmark(sizes, repeat=REPEAT):
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size_name in sizes:
+            size = parse_size(size_name)
+            for name, run in build_cases(temp_dir, size_name, size).items():
+                key = f"{size_name}/{name}"
+                results[key] = measure(run, repeat)
+                print(f"{key:<45} {results[key]['mb_per_s']:>10.1f} MB/s")
+    return {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "default_buffer_size": io.DEFAULT_BUFFER_SIZE,
+        "results": results,
+    }
+
+# Regression comparison
+# A case is a regression if its throughput dropped by more than the threshold compared to the baseline.
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for key, result in report["results"].items():
+        base = baseline["results"].get(key)
+        if base is None or not base["mb_per_s"]:
+            continue
+        change = result["mb_per_s"] / base["mb_per_s"] - 1
+        if change < -threshold:
+            regressions.append((key, base["mb_per_s"], result["mb_per_s"], change))
+    return regressions
+
+def save_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every open() mode, buffering and newline setting.")
+    parser.add_argument("--sizes", nargs="+", default=list(DEFAULT_SIZES), help="dataset sizes such as 4KB 8MB 1GB")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", default=RESULT_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+    for size_name in args.sizes:
+        parse_size(size_name)
+
+    report = run_benchmark(args.sizes, args.repeat)
+    save_json(args.output, report)
+    print(f"\nResults saved to {args.output}")
+
+    result_delimiter()
+
+    if args.save_baseline:
+        save_json(args.baseline, report)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}. Run with --save-baseline to store one.")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+    if not regressions:
+        print(f"No regression larger than {args.threshold:.0%} compared to the baseline of {baseline['created']}.")
+        return 0
+    print(f"Regressions larger than {args.threshold:.0%} compared to the baseline of {baseline['created']}")
+    for key, before, after, change in regressions:
+        print(f"{key:<45} {before:>10.1f} -> {after:>10.1f} MB/s ({change:+.1%})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+# In 006_Sqlite3BasicUsage.py, users are passed around as plain tuples and dicts
+# (user_list and update_user_list), and the students of 005_AboutOpenFunction.py are nested dicts.
+# Every Python object carries a header, and a dict carries a whole hash table,
+# so millions of such records in memory use far more RAM than the data itself.
+# In this file, I will make compact record types for the user and student schemas.
+
+# Two approaches are used.
+# __slots__ classes : one object per record, but without a __dict__.
+#                     The attributes are stored in fixed places, like a tuple with names.
+# Struct of arrays : one container for all records, with one column per attribute.
+#                    Numbers go into array (typed C arrays, 8 bytes or less per value),
+#                    and strings are encoded to UTF-8 and packed into one bytearray with an offset array.
+#                    Values that repeat a lot, like the car brand, are stored once and referred to by a small code.
+# Both convert to and from the sqlite rows and the JSON dicts without losing anything.
+# If NumPy is installed, the number columns can be viewed as NumPy arrays without a copy.
+
+import os
+import sys
+import time
+from array import array
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ====================================================================================================
+
+# __slots__ records
+class UserRecord:
+    __slots__ = ("id", "name", "email", "regdate")
+
+    def __init__(self, id, name, email, regdate):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.regdate = regdate
+
+    def __repr__(self):
+        return f"UserRecord({self.id!r}, {self.name!r}, {self.email!r}, {self.regdate!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, UserRecord) and self.to_row() == other.to_row()
+
+    # Equal records must have equal hashes, so they can be used in a set or as dict keys.
+    def __hash__(self):
+        return hash(self.to_row())
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_row(self):
+        return (self.id, self.name, self.email, self.regdate)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data["name"], data["email"], data["regdate"])
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "email": self.email, "regdate": self.regdate}
+
+# The nested car dict is flattened into two attributes and nested again in to_dict.
+class StudentRecord:
+    __slots__ = ("name", "age", "car_brend", "car_type")
+
+    def __init__(self, name, age, car_brend, car_type):
+        self.name = name
+        self.age = age
+        self.car_brend = car_brend
+        self.car_type = car_type
+
+    def __repr__(self):
+        return f"StudentRecord({self.name!r}, {self.age!r}, {self.car_brend!r}, {self.car_type!r})"
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data["age"], data["car"]["brend"], data["car"]["type"])
+
+    def to_dict(self):
+        return {"name": self.name, "age": self.age, "car": {"brend": self.car_brend, "type": self.car_type}}
+
+# ====================================================================================================
+
+# Columns
+# StringColumn keeps every string as UTF-8 bytes in one bytearray.
+# offsets[i] is where the i-th string starts, and offsets[i + 1] is where it ends.
+# None is marked in the nulls array, so NULL and an empty string stay different.
+class StringColumn:
+    __slots__ = ("data", "offsets", "nulls")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.nulls = array("b")
+
+    def __len__(self):
+        return len(self.nulls)
+
+    def append(self, value):
+        if value is None:
+            self.nulls.append(1)
+        else:
+            self.data += value.encode("utf-8")
+            self.nulls.append(0)
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, index):
+        if self.nulls[index]:
+            return None
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def __iter__(self):
+        data, offsets, nulls = self.data, self.offsets, self.nulls
+        for index in range(len(nulls)):
+            yield None if nulls[index] else data[offsets[index]:offsets[index + 1]].decode("utf-8")
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets) + len(self.nulls)
+
+# IntColumn keeps whole numbers in a typed array.
+# A value the array cannot hold (None, a float, a number too large for the typecode) is kept as it is
+# in others, by its position, and 0 is stored in the array in its place. So nothing is lost.
+class IntColumn:
+    __slots__ = ("values", "others")
+
+    def __init__(self, typecode="q"):
+        self.values = array(typecode)
+        self.others = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        if type(value) is int:
+            try:
+                self.values.append(value)
+                return
+            except OverflowError:
+                pass
+        self.others[len(self.values)] = value
+        self.values.append(0)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.values)
+        if index in self.others:
+            return self.others[index]
+        return self.values[index]
+
+    def __iter__(self):
+        if not self.others:
+            return iter(self.values)
+        others = self.others
+        return (others[index] if index in others else value for index, value in enumerate(self.values))
+
+    def nbytes(self):
+        return number_nbytes(self.values) + sum(sys.getsizeof(value) for value in self.others.values())
+
+# CategoryColumn stores each distinct value once, and each record keeps only a small code.
+# The codes start as 1 byte, and the array is widened when there are more distinct values than it can count.
+WIDER_TYPECODE = {"B": "H", "H": "I", "I": "Q"}
+
+class CategoryColumn:
+    __slots__ = ("codes", "categories", "_index")
+
+    def __init__(self, typecode="B"):
+        self.codes = array(typecode)
+        self.categories = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+            if code >> (8 * self.codes.itemsize):
+                self.codes = array(WIDER_TYPECODE[self.codes.typecode], self.codes)
+        self.codes.append(code)
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(sys.getsizeof(value) for value in self.categories)
+
+def number_nbytes(column):
+    return column.itemsize * len(column)
+
+def as_numpy(column):
+    # np.frombuffer shares the memory of the array, so nothing is copied.
+    if np is None:
+        raise ImportError("NumPy is required for as_numpy")
+    return np.frombuffer(column, dtype=column.typecode)
+
+# ====================================================================================================
+
+# Struct of arrays
+# id is stored in a signed 64-bit array like sqlite3 INTEGER.
+# regdate repeats a lot (many users are added at the same moment), so it is a category column.
+class UserTable:
+    def __init__(self):
+        self.ids = array("q")
+        self.names = StringColumn()
+        self.emails = StringColumn()
+        self.regdates = CategoryColumn("I")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append_row(self, row):
+        pk, name, email, regdate = row
+        self.ids.append(pk)
+        self.names.append(name)
+        self.emails.append(email)
+        self.regdates.append(regdate)
+
+    def extend_rows(self, rows):
+        for row in rows:
+            self.append_row(row)
+
+    def append_dict(self, data):
+        self.append_row((data["id"], data["name"], data["email"], data["regdate"]))
+
+    def row(self, index):
+        return (self.ids[index], self.names[index], self.emails[index], self.regdates[index])
+
+    def rows(self):
+        return zip(self.ids, self.names, self.emails, self.regdates)
+
+    def dicts(self):
+        for pk, name, email, regdate in self.rows():
+            yield {"id": pk, "name": name, "email": email, "regdate": regdate}
+
+    def nbytes(self):
+        return number_nbytes(self.ids) + self.names.nbytes() + self.emails.nbytes() + self.regdates.nbytes()
+
+# age fits in a 16-bit integer, and the brand and type of the car are categories.
+class StudentTable:
+    def __init__(self):
+        self.names = StringColumn()
+        self.ages = IntColumn("h")
+        self.car_brends = CategoryColumn()
+        self.car_types = CategoryColumn()
+
+    def __len__(self):
+        return len(self.ages)
+
+    def append_dict(self, data):
+        self.names.append(data["name"])
+        self.ages.append(data["age"])
+        self.car_brends.append(data["car"]["brend"])
+        self.car_types.append(data["car"]["type"])
+
+    def dicts(self):
+        for name, age, brend, car_type in zip(self.names, self.ages, self.car_brends, self.car_types):
+            yield {"name": name, "age": age, "car": {"brend": brend, "type": car_type}}
+
+    def nbytes(self):
+        return self.names.nbytes() + self.ages.nbytes() + self.car_brends.nbytes() + self.car_types.nbytes()
+
+# ====================================================================================================
+
+# Let's convert the data of 005_AboutOpenFunction.py and 006_Sqlite3BasicUsage.py.
+now = "2020-07-07 12:00:00"
+user_list = (
+    (3, "Belita", "Belita@example.com", now),
+    (4, "Charlotte", "Charlotte@example.com", now),
+    (5, "Cynthia", "Cynthia@example.com", now)
+)
+students = [
+    {"name" : "Dave", "age" : 24, "car" : {"brend" : "Audi", "type" : "SUV"}},
+    {"name" : "Lee", "age" : 22, "car" : {"brend" : "BMW", "type" : "SUV"}},
+]
+
+records = [UserRecord.from_row(row) for row in user_list]
+print(records[0])
+print(records[0].to_dict())
+assert [record.to_row() for record in records] == list(user_list)
+
+users = UserTable()
+users.extend_rows(user_list)
+users.append_dict({"id": 6, "name": "Emma", "email": None, "regdate": now})
+print(users.row(3))
+assert list(users.rows())[:3] == list(user_list)
+
+student_table = StudentTable()
+for student in students:
+    student_table.append_dict(student)
+print(StudentRecord.from_dict(students[0]))
+print(list(student_table.dicts()))
+assert list(student_table.dicts()) == students
+
+# Untypical values still come back as they went in.
+odd_students = students + [
+    {"name" : "Kim", "age" : None, "car" : {"brend" : "Kia", "type" : "Sedan"}},
+    {"name" : "Park", "age" : 21.5, "car" : {"brend" : "Hyundai", "type" : "Sedan"}},
+]
+odd_table = StudentTable()
+for student in odd_students:
+    odd_table.append_dict(student)
+print(list(odd_table.dicts())[2:])
+assert list(odd_table.dicts()) == odd_students
+
+brends = CategoryColumn()
+for number in range(300):
+    brends.append(f"brend{number}")
+print(f"300 categories : typecode {brends.codes.typecode!r}, last {brends[-1]!r}")
+assert list(brends) == [f"brend{number}" for number in range(300)]
+assert len({UserRecord.from_row(row) for row in user_list + user_list}) == len(user_list)
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Bytes per record count the record objects and the strings they own, measured with sys.getsizeof.
+# Iteration speed is measured by reading every email, as a deduplication pass would.
+BENCHMARK_RECORD_COUNT = 300_000
+
+def deep_size(value, seen):
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key, seen) + deep_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (tuple, list)):
+        size += sum(deep_size(item, seen) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(deep_size(getattr(value, name), seen) for name in value.__slots__)
+    return size
+
+def report(name, size, count, iterate):
+    start = time.perf_counter()
+    total = iterate()
+    elapsed = time.perf_counter() - start
+    assert total == count
+    print(f"{name:<24} {size / count:>8.1f} bytes/record {count / elapsed:>14,.0f} records/s")
+
+rows = [(pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(BENCHMARK_RECORD_COUNT)]
+seen = set()
+# The same regdate string is shared, as it is when sqlite3 returns rows inserted at the same time.
+report("tuple", sum(deep_size(row, seen) for row in rows), len(rows),
+       lambda: sum(1 for row in rows if row[2]))
+
+dicts = [{"id": pk, "name": name, "email": email, "regdate": regdate} for pk, name, email, regdate in rows]
+seen = set()
+report("dict", sum(deep_size(data, seen) for data in dicts), len(dicts),
+       lambda: sum(1 for data in dicts if data["email"]))
+del dicts
+
+user_records = [UserRecord.from_row(row) for row in rows]
+seen = set()
+report("UserRecord (__slots__)", sum(deep_size(record, seen) for record in user_records), len(user_records),
+       lambda: sum(1 for record in user_records if record.email))
+del user_records
+
+user_table = UserTable()
+user_table.extend_rows(rows)
+report("UserTable (columns)", user_table.nbytes(), len(user_table),
+       lambda: sum(1 for email in user_table.emails if email))
+if np is not None:
+    print(f"ids as NumPy : {as_numpy(user_table.ids)[:5]}")
+
+print()
+student_dicts = [
+    {"name": f"student{number}", "age": 20 + number % 10, "car": {"brend": ("Audi", "BMW")[number % 2], "type": "SUV"}}
+    for number in range(BENCHMARK_RECORD_COUNT)
+]
+seen = set()
+report("student dict", sum(deep_size(data, seen) for data in student_dicts), len(student_dicts),
+       lambda: sum(1 for data in student_dicts if data["car"]["brend"]))
+
+student_records = [StudentRecord.from_dict(data) for data in student_dicts]
+seen = set()
+report("StudentRecord", sum(deep_size(record, seen) for record in student_records), len(student_records),
+       lambda: sum(1 for record in student_records if record.car_brend))
+del student_records
+
+student_table = StudentTable()
+for data in student_dicts:
+    student_table.append_dict(data)
+report("StudentTable (columns)", student_table.nbytes(), len(student_table),
+       lambda: sum(1 for brend in student_table.car_brends if brend))
@@ -0,0 +1,212 @@
+# The Update Many section of 006_Sqlite3BasicUsage.py runs executemany with
+# UPDATE user SET name = :name, email = :name || '@example.com' WHERE id = :id.
+# executemany still runs that UPDATE once per row, so every row does its own primary key lookup
+# and goes through the whole statement again, in whatever order the changes arrive.
+# In this file, I will make a bulk update that works in two steps.
+
+# 1. The changes are streamed into a temporary table in batches.
+#    A temp table lives only in this connection and is never written to the database file.
+# 2. One statement applies all of them at once, inside the same transaction.
+#    UPDATE ... FROM : joins user with the temp table. (SQLite 3.33.0 or later)
+#    INSERT ... ON CONFLICT DO UPDATE : the upsert, which works from SQLite 3.24.0.
+#    Only ids that exist in user are selected, so it never inserts new users.
+# On older SQLite, it falls back to the executemany of 006_Sqlite3BasicUsage.py, in batches.
+# Whatever the method is, everything is committed once at the end, or rolled back on an error.
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from itertools import islice
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+UPDATE_FROM_VERSION = (3, 33, 0)
+UPSERT_VERSION = (3, 24, 0)
+
+def choose_method():
+    if sqlite3.sqlite_version_info >= UPDATE_FROM_VERSION:
+        return "update_from"
+    if sqlite3.sqlite_version_info >= UPSERT_VERSION:
+        return "upsert"
+    return "executemany"
+
+# The changes can be dicts like update_user_list, or (id, name) tuples.
+def as_change(change):
+    if isinstance(change, dict):
+        return (change["id"], change["name"])
+    return tuple(change)
+
+def stream_changes(cur, changes, batch_size):
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS user_changes(
+            id INTEGER PRIMARY KEY,
+            name TEXT
+        )
+    """)
+    cur.execute("DELETE FROM temp.user_changes")
+    # With executemany, a later change of the same id wins, so REPLACE keeps the last one as well.
+    changes = map(as_change, changes)
+    while True:
+        batch = list(islice(changes, batch_size))
+        if not batch:
+            break
+        cur.executemany("""
+            INSERT OR REPLACE INTO temp.user_changes (id, name)
+            VALUES (?, ?)
+        """, batch)
+
+def apply_update_from(cur):
+    # Without the IN condition, sqlite3 scans the whole user table and looks up each row in the changes.
+    # With it, only the ids in the changes are searched, which matters when the changes are few.
+    cur.execute("""
+        UPDATE user
+        SET name = c.name, email = c.name || '@example.com'
+        FROM temp.user_changes AS c
+        WHERE user.id = c.id AND user.id IN (SELECT id FROM temp.user_changes)
+    """)
+    return cur.rowcount
+
+def apply_upsert(cur):
+    # WHERE true is required, otherwise ON CONFLICT would be read as part of the join.
+    cur.execute("""
+        INSERT INTO user (id, name, email, regdate)
+        SELECT c.id, c.name, c.name || '@example.com', u.regdate
+        FROM temp.user_changes AS c
+        JOIN user AS u ON u.id = c.id
+        WHERE true
+        ON CONFLICT(id) DO UPDATE
+        SET name = excluded.name, email = excluded.email
+    """)
+    return cur.rowcount
+
+def apply_executemany(cur, changes, batch_size):
+    total = 0
+    changes = map(as_change, changes)
+    while True:
+        batch = [{"id": pk, "name": name} for pk, name in islice(changes, batch_size)]
+        if not batch:
+            break
+        cur.executemany("""
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, batch)
+        total += cur.rowcount
+    return total
+
+def bulk_update_users(conn, changes, batch_size=50_000, method=None):
+    method = method or choose_method()
+    cur = conn.cursor()
+    if not conn.in_transaction:
+        cur.execute("BEGIN")
+    try:
+        if method == "executemany":
+            total = apply_executemany(cur, changes, batch_size)
+        else:
+            stream_changes(cur, changes, batch_size)
+            if method == "update_from":
+                total = apply_update_from(cur)
+            elif method == "upsert":
+                total = apply_upsert(cur)
+            else:
+                raise ValueError(f"Unknown method : {method}")
+            cur.execute("DELETE FROM temp.user_changes")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return total
+
+# ====================================================================================================
+
+# Let's do the Update Many section of 006_Sqlite3BasicUsage.py with every method.
+def create_users(conn, count):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    cur.executemany("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, ((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(1, count + 1)))
+    conn.commit()
+
+update_user_list = [
+    {"name":"Erica", "id":1},
+    {"name":"Frances", "id":2},
+    {"name":"Edith", "id":4},
+    {"name":"Nobody", "id":100},
+]
+
+print(f"SQLite {sqlite3.sqlite_version} : {choose_method()} is used by default")
+for method in ("update_from", "upsert", "executemany"):
+    conn = sqlite3.connect(":memory:")
+    create_users(conn, 5)
+    updated = bulk_update_users(conn, update_user_list, method=method)
+    print(f"\n{method} : {updated} rows updated")
+    for row in conn.execute("SELECT id, name, email, regdate FROM user"):
+        print(row)
+    conn.close()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# The loop of 006_Sqlite3BasicUsage.py (one executemany, one commit) is compared with each method.
+# The ids are shuffled, as renames from another system would be.
+# Python's executemany already reuses one prepared statement, so most of the time goes to
+# finding and rewriting the pages of user, which every method has to do.
+# The numbers show how much the set-based statements save on this machine, if anything,
+# and the temp table is still useful when the changes come from a query or a join.
+BENCHMARK_USER_COUNT = 500_000
+BENCHMARK_CHANGE_COUNTS = (1_000, 10_000, 100_000, 500_000)
+
+def update_with_loop(conn, changes):
+    cur = conn.cursor()
+    cur.executemany("""
+        UPDATE user
+        SET name = :name, email = :name || '@example.com'
+        WHERE id = :id
+    """, changes)
+    conn.commit()
+    return cur.rowcount
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "026_benchmark.db"))
+    create_users(conn, BENCHMARK_USER_COUNT)
+    # The first method to run would otherwise pay for reading the table from the disk.
+    conn.execute("SELECT sum(length(name) + length(email)) FROM user").fetchone()
+    generator = random.Random(26)
+    for change_count in BENCHMARK_CHANGE_COUNTS:
+        for name, function in (
+            ("006 executemany", update_with_loop),
+            ("update_from", lambda conn, changes: bulk_update_users(conn, changes, method="update_from")),
+            ("upsert", lambda conn, changes: bulk_update_users(conn, changes, method="upsert")),
+            ("executemany batches", lambda conn, changes: bulk_update_users(conn, changes, method="executemany")),
+        ):
+            # Every method gets its own ids, so no method finds the pages already in the cache of another.
+            ids = generator.sample(range(1, BENCHMARK_USER_COUNT + 1), change_count)
+            changes = [{"name": f"renamed{pk}", "id": pk} for pk in ids]
+            start = time.perf_counter()
+            updated = function(conn, changes)
+            elapsed = time.perf_counter() - start
+            assert updated == change_count
+            print(f"{change_count:>8} changes {name:<20} {elapsed:>8.3f} sec {change_count / elapsed:>12,.0f} rows/s")
+        print()
+    conn.close()
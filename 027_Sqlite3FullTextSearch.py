@@ -0,0 +1,256 @@
+# In 006_Sqlite3BasicUsage.py, the only way to look up a user is show_select_one by the primary key.
+# To find users by a part of their name or email, we would need WHERE name LIKE '%...%',
+# and a LIKE with a leading % cannot use any index, so every search reads the whole table.
+# In this file, I will make a search subsystem with FTS5, the full-text search engine built into sqlite3.
+
+# How it is kept in sync
+# The FTS5 table is an external content table. It stores only the search index,
+# and the text itself stays in the user table (content='user', content_rowid='id').
+# Triggers on user update the index whenever the usual INSERT, UPDATE and DELETE statements run,
+# so the code of 006_Sqlite3BasicUsage.py does not have to change at all.
+
+# Two tokenizers
+# unicode61 : splits the text into words. "Belita@example.com" becomes belita, example, com.
+#             Word and prefix searches ("bel*") are very fast, and results are ranked with bm25.
+# trigram : indexes every sequence of 3 characters, so any substring of 3 or more characters can be found,
+#           like LIKE '%lit%' but with an index. (SQLite 3.34.0 or later)
+
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+# prefix='2 3' builds extra indexes for 2 and 3 character prefixes, so short prefix searches are fast too.
+TOKENIZERS = {
+    "user_fts": "tokenize='unicode61', prefix='2 3'",
+    "user_trigram": "tokenize='trigram'",
+}
+
+def create_search_index(conn, table="user_fts"):
+    cur = conn.cursor()
+    exists = cur.execute("""
+        SELECT 1
+        FROM sqlite_master
+        WHERE type = 'table' AND name = ?
+    """, (table,)).fetchone() is not None
+    cur.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            name,
+            email,
+            content='user',
+            content_rowid='id',
+            {TOKENIZERS[table]}
+        )
+    """)
+    # An external content table must be told the old values to remove them from the index.
+    # That is what the special 'delete' insert does.
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_after_insert AFTER INSERT ON user BEGIN
+            INSERT INTO {table} (rowid, name, email)
+            VALUES (new.id, new.name, new.email);
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_after_delete AFTER DELETE ON user BEGIN
+            INSERT INTO {table} ({table}, rowid, name, email)
+            VALUES ('delete', old.id, old.name, old.email);
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_after_update AFTER UPDATE OF id, name, email ON user BEGIN
+            INSERT INTO {table} ({table}, rowid, name, email)
+            VALUES ('delete', old.id, old.name, old.email);
+            INSERT INTO {table} (rowid, name, email)
+            VALUES (new.id, new.name, new.email);
+        END
+    """)
+    # Users that existed before the index was created are indexed here.
+    # An index that already existed is kept up to date by the triggers, so it is not rebuilt again.
+    if not exists:
+        cur.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+    conn.commit()
+
+def drop_search_index(conn, table="user_fts"):
+    cur = conn.cursor()
+    for event in ("insert", "delete", "update"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_after_{event}")
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.commit()
+
+# ====================================================================================================
+
+# Queries
+# The words typed by a user are quoted, so characters like '@', '-' or '"' are searched as text
+# instead of being read as FTS5 query syntax.
+def make_match_query(text, prefix=True):
+    terms = []
+    for word in text.split():
+        term = '"' + word.replace('"', '""') + '"'
+        terms.append(term + "*" if prefix else term)
+    return " ".join(terms)
+
+# A trigram index needs at least 3 characters in every word, and a plain quoted string is a substring search.
+# A shorter word would match nothing, so it is refused instead of returning an empty result silently.
+def table_query(text, table):
+    if table == "user_trigram":
+        if any(len(word) < 3 for word in text.split()):
+            raise ValueError("A substring search needs at least 3 characters in every word")
+        return make_match_query(text, prefix=False)
+    return make_match_query(text)
+
+# Results are ordered by rank (bm25, best first), and the page is chosen with LIMIT and OFFSET.
+# highlight() marks the matched part of the name with [ and ].
+# Empty input has no words to search for, and an empty MATCH would be an FTS5 syntax error.
+def search_users(conn, text, page=1, page_size=20, table="user_fts"):
+    if not text.strip():
+        return []
+    query = table_query(text, table)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT u.id, highlight({table}, 0, '[', ']'), u.email, u.regdate
+        FROM {table}
+        JOIN user AS u ON u.id = {table}.rowid
+        WHERE {table} MATCH ?
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    """, (query, page_size, (page - 1) * page_size))
+    return cur.fetchall()
+
+def count_matches(conn, text, table="user_fts"):
+    if not text.strip():
+        return 0
+    query = table_query(text, table)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT count(*)
+        FROM {table}
+        WHERE {table} MATCH ?
+    """, (query,))
+    return cur.fetchone()[0]
+
+# ====================================================================================================
+
+# Let's run the steps of 006_Sqlite3BasicUsage.py with the search indexes in place.
+def create_user_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    conn.commit()
+
+conn = sqlite3.connect(":memory:")
+create_user_table(conn)
+create_search_index(conn, "user_fts")
+create_search_index(conn, "user_trigram")
+cur = conn.cursor()
+cur.execute("""
+    INSERT INTO user
+    VALUES (1, 'Bonita', 'Bonita@example.com', ?)
+""", (now,))
+cur.execute("""
+    INSERT INTO user (id, name, email, regdate)
+    VALUES (?, ?, ?, ?)
+""", (2, 'Bono', 'Bono@example.com', now))
+user_list = (
+    (3, 'Belita', 'Belita@example.com', now),
+    (4, 'Charlotte', 'Charlotte@example.com', now),
+    (5, 'Cynthia', 'Cynthia@example.com', now)
+)
+cur.executemany("""
+    INSERT INTO user (id, name, email, regdate)
+    VALUES (?, ?, ?, ?)
+""", user_list)
+conn.commit()
+
+print(f"prefix 'bon' : {search_users(conn, 'bon')}")
+print(f"substring 'lit' : {search_users(conn, 'lit', table='user_trigram')}")
+print(f"empty input : {search_users(conn, '  ')}, {count_matches(conn, '')} matches")
+try:
+    count_matches(conn, "ab cd", table="user_trigram")
+except ValueError as e:
+    print(f"substring 'ab cd' : {e}")
+
+cur.executemany("""
+    UPDATE user
+    SET name = :name, email = :name || '@example.com'
+    WHERE id = :id
+""", [{"name":"Erica", "id":1}, {"name":"Frances", "id":2}, {"name":"Edith", "id":4}])
+cur.execute("""
+    DELETE FROM user
+    WHERE id = ?
+""", (3,))
+conn.commit()
+
+print(f"\nAfter Update and Delete")
+print(f"prefix 'bon' : {search_users(conn, 'bon')}")
+print(f"prefix 'e' : {search_users(conn, 'e', page_size=2)} (page 1 of {count_matches(conn, 'e')} matches)")
+print(f"prefix 'e' : {search_users(conn, 'e', page=2, page_size=2)} (page 2)")
+print(f"substring 'ance' : {search_users(conn, 'ance', table='user_trigram')}")
+conn.close()
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# A LIKE '%...%' scan is compared with both indexes as the table grows.
+# The indexes are built once after loading with 'rebuild', which is faster than running the triggers per row.
+# Each query is the average of several search words, returning the first page.
+BENCHMARK_SIZES = (10_000, 100_000, 500_000)
+SEARCH_WORDS = ("user12", "user345", "user7777", "nomatch")
+QUERY_REPEAT = 5
+
+def generate_users(start, count):
+    for pk in range(start, start + count):
+        yield (pk, f"user{pk}", f"user{pk}@example.com", now)
+
+def like_search(conn, text, page_size=20):
+    return conn.execute("""
+        SELECT id, name, email, regdate
+        FROM user
+        WHERE name LIKE ? OR email LIKE ?
+        LIMIT ?
+    """, (f"%{text}%", f"%{text}%", page_size)).fetchall()
+
+def average_ms(function):
+    start = time.perf_counter()
+    for _ in range(QUERY_REPEAT):
+        for word in SEARCH_WORDS:
+            function(word)
+    return (time.perf_counter() - start) / (QUERY_REPEAT * len(SEARCH_WORDS)) * 1000
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = sqlite3.connect(os.path.join(temp_dir, "027_benchmark.db"))
+    create_user_table(conn)
+    loaded = 0
+    for size in BENCHMARK_SIZES:
+        drop_search_index(conn, "user_fts")
+        drop_search_index(conn, "user_trigram")
+        conn.executemany("INSERT INTO user VALUES (?, ?, ?, ?)", generate_users(loaded + 1, size - loaded))
+        conn.commit()
+        loaded = size
+        start = time.perf_counter()
+        create_search_index(conn, "user_fts")
+        create_search_index(conn, "user_trigram")
+        build = time.perf_counter() - start
+
+        like = average_ms(lambda word: like_search(conn, word))
+        prefix = average_ms(lambda word: search_users(conn, word))
+        trigram = average_ms(lambda word: search_users(conn, word, table="user_trigram"))
+        print(f"{size:>8} users | index build {build:>7.2f} sec | LIKE {like:>8.3f} ms | "
+              f"fts5 prefix {prefix:>7.3f} ms | trigram {trigram:>7.3f} ms")
+    conn.close()
@@ -0,0 +1,458 @@
+# The user table of 006_Sqlite3BasicUsage.py has only its INTEGER PRIMARY KEY.
+# show_select_one(pk) is fast, but a query by email or by a range of regdate
+# reads every row of the table, and nothing tells us that it happens.
+# In this file, I will make a query-plan advisor.
+
+# What the advisor does
+# 1. The connection records every statement that goes through it,
+#    with how many times it ran, how long execute took (until the first row), and one set of parameters.
+# 2. EXPLAIN QUERY PLAN shows how sqlite3 runs each recorded statement.
+#    "SCAN user" means a full table scan, and "SEARCH user USING INDEX ..." means an index is used.
+#    SCANs of tables larger than min_rows are flagged.
+# 3. For each flagged statement, an index is suggested from its WHERE and ORDER BY columns.
+#    Equality columns come first, then one range column, then the ORDER BY columns.
+#    If the selected columns are few, they are appended so that the index covers the query,
+#    and sqlite3 never has to read the table at all.
+# 4. apply() creates the suggested indexes, runs ANALYZE, and checks the plan again.
+#    An index that did not remove the SCAN (LIKE '%...%' for example) is dropped again.
+# 5. The report shows the plan and the latency of each statement before and after.
+#    UPDATE and DELETE statements are timed on a copy, so the live data is never changed.
+#    The copy holds only the tables those statements use, with their indexes,
+#    but those tables are copied whole, so on a large table the copy can take longer than the advice saves.
+#    Set measure_writes=False to skip it, and writes are then not timed.
+# PRAGMA optimize is run every optimize_interval seconds, as sqlite3 recommends for long-lived connections.
+
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+# Recording
+# The same cursor and connection subclasses as 023_Instrumentation.py,
+# but the statements are kept with their parameters so that they can be explained later.
+def normalize_sql(sql):
+    return " ".join(sql.split())
+
+class QueryStats:
+    __slots__ = ("sql", "parameters", "count", "total")
+
+    def __init__(self, sql, parameters):
+        self.sql = sql
+        self.parameters = parameters
+        self.count = 0
+        self.total = 0.0
+
+class AdvisedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.record(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        # The parameters are often a generator, so the first set is not kept here.
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self.connection.record(sql, None, time.perf_counter() - start)
+
+class AdvisedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = {}
+        self.recording = True
+
+    def cursor(self, factory=AdvisedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def record(self, sql, parameters, elapsed):
+        if not self.recording:
+            return
+        key = normalize_sql(sql)
+        stats = self.queries.get(key)
+        if stats is None:
+            stats = self.queries[key] = QueryStats(key, parameters)
+        stats.count += 1
+        stats.total += elapsed
+
+def connect(database, **kwargs):
+    return sqlite3.connect(database, factory=AdvisedConnection, **kwargs)
+
+# ====================================================================================================
+
+# Plans
+def explain(conn, sql, parameters=()):
+    rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", parameters or ()).fetchall()
+    return [detail for _, _, _, detail in rows]
+
+# "SCAN user" and "SCAN user USING COVERING INDEX ..." both read every entry.
+# SQLite before 3.36 writes "SCAN TABLE user" and "SCAN TABLE user USING COVERING INDEX ..." instead.
+# "SCAN u" is also possible when the table has an alias, so the alias is mapped back to the table.
+def find_scans(plan, aliases):
+    scans = []
+    for detail in plan:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if match and match.group(1) in aliases:
+            scans.append(aliases[match.group(1)])
+    return scans
+
+def table_aliases(conn, sql):
+    tables = [name for name, in sqlite3.Connection.execute(
+        conn, "SELECT name FROM sqlite_master WHERE type = 'table'")]
+    aliases = {}
+    for table in tables:
+        aliases[table] = table
+        for alias in re.findall(rf"\b{table}\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE):
+            if alias.upper() not in ("WHERE", "SET", "ORDER", "GROUP", "LIMIT", "JOIN", "ON", "VALUES"):
+                aliases[alias] = table
+    return aliases
+
+def used_tables(conn, sql):
+    tables = [name for name, in sqlite3.Connection.execute(
+        conn, "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    return [table for table in tables if re.search(rf"\b{table}\b", sql, re.IGNORECASE)]
+
+def index_columns(conn, table):
+    indexes = {}
+    for _, name, *_ in sqlite3.Connection.execute(conn, f"PRAGMA index_list({table})").fetchall():
+        rows = sqlite3.Connection.execute(conn, f"PRAGMA index_info({name})").fetchall()
+        indexes[name] = [column for _, _, column in rows]
+    return indexes
+
+def table_rows(conn, table):
+    return sqlite3.Connection.execute(conn, f"SELECT count(*) FROM {table}").fetchone()[0]
+
+# ====================================================================================================
+
+# Suggestions
+# The columns are found with regular expressions, which is enough for the simple statements of the helpers.
+def clause(sql, keyword, ends):
+    match = re.search(rf"\b{keyword}\b(.*?)(?:\b(?:{'|'.join(ends)})\b|$)", sql, re.IGNORECASE)
+    return match.group(1) if match else ""
+
+def suggest_index(conn, sql, table, covering_limit=3):
+    columns = sqlite3.Connection.execute(conn, f"PRAGMA table_info({table})").fetchall()
+    # The INTEGER PRIMARY KEY is the rowid, which every index already contains.
+    names = [name for _, name, type_, _, _, pk in columns if not (pk and type_.upper() == "INTEGER")]
+    where = clause(sql, "WHERE", ("GROUP BY", "ORDER BY", "LIMIT"))
+    order_by = clause(sql, "ORDER BY", ("LIMIT",))
+    equal = [name for name in names
+             if re.search(rf"\b{name}\s*(?:==?|IS\b|IN\b)", where, re.IGNORECASE)]
+    ranges = [name for name in names if name not in equal
+              and re.search(rf"\b{name}\s*(?:<|>|BETWEEN\b|LIKE\b|GLOB\b)", where, re.IGNORECASE)]
+    ordered = [name for name in names if name not in equal and re.search(rf"\b{name}\b", order_by)]
+    # Only one range column can use an index, and it must come last among the searched columns.
+    indexed = equal + ranges[:1] + [name for name in ordered if name not in ranges[:1]]
+    if not indexed:
+        # Without WHERE or ORDER BY, reading the whole table is the only way, as in show_select_all.
+        return None
+    if sql.upper().startswith("SELECT"):
+        selected = clause(sql, "SELECT", ("FROM",))
+        extra = [name for name in names if name not in indexed
+                 and (selected.strip() == "*" or re.search(rf"\b{name}\b", selected))]
+        if len(indexed) + len(extra) <= covering_limit:
+            indexed += extra
+    return f"{table}_{'_'.join(indexed)}_idx", indexed
+
+# ====================================================================================================
+
+class QueryAdvisor:
+    def __init__(self, conn, min_rows=1000, optimize_interval=60.0, measure_repeat=20, measure_writes=True):
+        self.conn = conn
+        self.measure_writes = measure_writes
+        self.min_rows = min_rows
+        self.optimize_interval = optimize_interval
+        self.measure_repeat = measure_repeat
+        self.findings = []
+        self._next_optimize = time.monotonic() + optimize_interval
+
+    # Called by the application from time to time, for example after every batch of work.
+    # A sqlite3 connection belongs to one thread, so it is not run from a timer thread.
+    def maybe_optimize(self):
+        if time.monotonic() < self._next_optimize:
+            return False
+        self.optimize()
+        return True
+
+    def optimize(self):
+        # analysis_limit keeps ANALYZE from reading whole tables when PRAGMA optimize decides to run it.
+        sqlite3.Connection.execute(self.conn, "PRAGMA analysis_limit = 1000")
+        sqlite3.Connection.execute(self.conn, "PRAGMA optimize")
+        self._next_optimize = time.monotonic() + self.optimize_interval
+
+    # SELECTs are timed on the connection itself, because they change nothing.
+    # UPDATEs and DELETEs are timed on a backup copy, never on the live data,
+    # and each run is undone with ROLLBACK TO, so every run works on the same rows.
+    def measure(self, stats, copy):
+        parameters = stats.parameters or ()
+        is_select = stats.sql.upper().startswith("SELECT")
+        if not is_select and copy is None:
+            return None
+        start = time.perf_counter()
+        for _ in range(self.measure_repeat):
+            if is_select:
+                sqlite3.Connection.execute(self.conn, stats.sql, parameters).fetchall()
+            else:
+                copy.execute("SAVEPOINT advisor_measure")
+                copy.execute(stats.sql, parameters)
+                copy.execute("ROLLBACK TO advisor_measure")
+                copy.execute("RELEASE advisor_measure")
+        return (time.perf_counter() - start) / self.measure_repeat * 1000
+
+    # The copy is made only when a write has to be measured,
+    # and the indexes are created and dropped on it as on the real database.
+    # Only the tables used by the writes are copied, with their indexes.
+    # Their rows are streamed from the live database, which is only read.
+    # Triggers are not copied, so their cost is not part of the measured time.
+    def _open_copy(self, temp_dir):
+        tables = set()
+        for finding in self.findings:
+            if not finding["stats"].sql.upper().startswith("SELECT"):
+                tables.update(used_tables(self.conn, finding["stats"].sql))
+        if not tables or not self.measure_writes:
+            return None
+        copy = sqlite3.connect(os.path.join(temp_dir, "advisor_copy.db"), isolation_level=None)
+        for table in sorted(tables):
+            # The table comes first, and its indexes are created after the rows are in.
+            schema = sqlite3.Connection.execute(self.conn, """
+                SELECT sql
+                FROM sqlite_master
+                WHERE tbl_name = ? AND type IN ('table', 'index') AND sql IS NOT NULL
+                ORDER BY type = 'index'
+            """, (table,)).fetchall()
+            copy.execute(schema[0][0])
+            rows = sqlite3.Connection.execute(self.conn, f"SELECT * FROM {table}")
+            placeholders = ", ".join("?" * len(rows.description))
+            copy.execute("BEGIN")
+            copy.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+            copy.execute("COMMIT")
+            for sql, in schema[1:]:
+                copy.execute(sql)
+        return copy
+
+    # An index of a table that only SELECTs use is not mirrored, because that table is not in the copy.
+    def _execute_ddl(self, sql, copy, table=None):
+        sqlite3.Connection.execute(self.conn, sql)
+        if copy is not None and (table is None or copy.execute("""
+            SELECT 1
+            FROM sqlite_master
+            WHERE type = 'table' AND name = ?
+        """, (table,)).fetchone()):
+            copy.execute(sql)
+
+    def review(self):
+        self.findings = []
+        row_counts = {}
+        for stats in self.conn.queries.values():
+            # Statements run with executemany have no stored parameters, and INSERT always appends.
+            if stats.parameters is None or not stats.sql.upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            plan = explain(self.conn, stats.sql, stats.parameters)
+            for table in find_scans(plan, table_aliases(self.conn, stats.sql)):
+                if table not in row_counts:
+                    row_counts[table] = table_rows(self.conn, table)
+                if row_counts[table] < self.min_rows:
+                    continue
+                self.findings.append({
+                    "stats": stats,
+                    "table": table,
+                    "plan_before": plan,
+                    "suggestion": suggest_index(self.conn, stats.sql, table),
+                })
+        return self.findings
+
+    def apply(self):
+        # Creating an index commits, so uncommitted writes of the application would be committed with it.
+        # The application has to commit or roll back first.
+        if self.conn.in_transaction:
+            raise RuntimeError("The connection has an open transaction. Commit or roll back before apply().")
+        self.conn.recording = False
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                copy = self._open_copy(temp_dir)
+                try:
+                    self._apply(copy)
+                finally:
+                    if copy is not None:
+                        copy.close()
+        finally:
+            self.conn.recording = True
+        return self.findings
+
+    def _apply(self, copy):
+        for finding in self.findings:
+            finding["ms_before"] = self.measure(finding["stats"], copy)
+        # Longer suggestions are created first. A suggestion whose columns are the beginning
+        # of an index that already exists is served by that index, so no duplicate is created.
+        created = {}
+        suggested = [finding for finding in self.findings if finding["suggestion"] is not None]
+        for finding in sorted(suggested, key=lambda finding: -len(finding["suggestion"][1])):
+            name, columns = finding["suggestion"]
+            existing = index_columns(self.conn, finding["table"])
+            for other, other_columns in existing.items():
+                if other_columns[:len(columns)] == columns:
+                    finding["suggestion"] = (other, other_columns)
+                    break
+            else:
+                self._execute_ddl(f"CREATE INDEX {name} ON {finding['table']}({', '.join(columns)})", copy, finding["table"])
+                created[name] = finding["table"]
+        self._execute_ddl("ANALYZE", copy)
+        self.conn.commit()
+
+        useful = set()
+        for finding in self.findings:
+            stats = finding["stats"]
+            finding["plan_after"] = explain(self.conn, stats.sql, stats.parameters)
+            finding["ms_after"] = self.measure(stats, copy)
+            if finding["suggestion"] and finding["table"] not in find_scans(
+                    finding["plan_after"], table_aliases(self.conn, stats.sql)):
+                useful.add(finding["suggestion"][0])
+        for name in created:
+            if name not in useful:
+                self._execute_ddl(f"DROP INDEX {name}", copy, created[name])
+        self.conn.commit()
+        for finding in self.findings:
+            finding["kept"] = finding["suggestion"] is not None and finding["suggestion"][0] in useful
+
+    def print_report(self):
+        for finding in self.findings:
+            stats = finding["stats"]
+            print(f"{stats.sql}")
+            print(f"    ran {stats.count} times, {stats.total * 1000:.3f} ms in total")
+            print(f"    before : {' / '.join(finding['plan_before'])}")
+            if finding["suggestion"] is None:
+                print("    no index can help : the statement reads the whole table by design")
+                continue
+            name, columns = finding["suggestion"]
+            print(f"    suggestion : {name} ON {finding['table']}({', '.join(columns)})")
+            if "plan_after" not in finding:
+                continue
+            print(f"    after : {' / '.join(finding['plan_after'])}")
+            verdict = "kept" if finding["kept"] else "dropped, the plan did not change"
+            if finding["ms_before"] is None:
+                print(f"    latency : not measured (measure_writes=False), index {verdict}")
+                continue
+            speedup = finding["ms_before"] / finding["ms_after"] if finding["ms_after"] else float("inf")
+            print(f"    latency : {finding['ms_before']:.3f} ms -> {finding['ms_after']:.3f} ms "
+                  f"(x{speedup:.1f}), index {verdict}")
+
+# ====================================================================================================
+
+# Let's run the helpers of 006_Sqlite3BasicUsage.py, plus the lookups that had no index.
+USER_COUNT = 200_000
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    conn = connect(os.path.join(temp_dir, "028_database.db"))
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user(
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT,
+            regdate TEXT
+        )
+    """)
+    first_date = datetime(2020, 1, 1)
+    cur.executemany("""
+        INSERT INTO user (id, name, email, regdate)
+        VALUES (?, ?, ?, ?)
+    """, (
+        (pk, f"user{pk}", f"user{pk}@example.com",
+         (first_date + timedelta(minutes=pk)).strftime("%Y-%m-%d %H:%M:%S"))
+        for pk in range(1, USER_COUNT + 1)
+    ))
+    conn.commit()
+
+    def show_select_all():
+        cur.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+        """)
+        return cur.fetchall()
+
+    def show_select_one(pk):
+        cur.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE id = ?
+        """, (pk,))
+        return cur.fetchone()
+
+    def select_by_email(email):
+        cur.execute("""
+            SELECT id, name
+            FROM user
+            WHERE email = ?
+        """, (email,))
+        return cur.fetchone()
+
+    def select_by_regdate(start, end):
+        cur.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE regdate BETWEEN ? AND ?
+            ORDER BY regdate
+        """, (start, end))
+        return cur.fetchall()
+
+    def search_by_name(text):
+        cur.execute("""
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE name LIKE ?
+        """, (f"%{text}%",))
+        return cur.fetchall()
+
+    def update_by_email(name, email):
+        cur.execute("""
+            UPDATE user
+            SET name = :name
+            WHERE email = :email
+        """, {"name": name, "email": email})
+        conn.commit()
+
+    show_select_all()
+    for pk in (1, 2, 3):
+        show_select_one(pk)
+    select_by_email("user777@example.com")
+    select_by_regdate("2020-02-01 00:00:00", "2020-02-02 00:00:00")
+    search_by_name("1234")
+    update_by_email("Emma", "user3@example.com")
+
+    advisor = QueryAdvisor(conn, optimize_interval=0.0)
+    print(f"{len(advisor.review())} statements scan a table of more than {advisor.min_rows} rows\n")
+    # An uncommitted write of the application is never committed or lost by apply().
+    cur.execute("INSERT INTO user (id, name, email, regdate) VALUES (?, ?, ?, ?)",
+                (USER_COUNT + 1, "Frances", "Frances@example.com", now))
+    try:
+        advisor.apply()
+    except RuntimeError as e:
+        print(e)
+    conn.commit()
+    advisor.apply()
+    advisor.print_report()
+    print(f"\nindexes : {list(index_columns(conn, 'user'))}")
+    print(f"user3 after the advisor measured the UPDATE : {show_select_one(3)}")
+
+    # The application calls maybe_optimize() between batches. It runs PRAGMA optimize when the interval has passed.
+    print(f"PRAGMA optimize ran : {advisor.maybe_optimize()}")
+    conn.close()
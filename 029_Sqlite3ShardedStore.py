@@ -0,0 +1,319 @@
+# Everything in 006_Sqlite3BasicUsage.py goes to the single file datasets/006_database.db.
+# sqlite3 allows only one writer per database file at a time,
+# so however many threads want to write, the writes happen one after another.
+# In this file, I will split the user table across N database files (shards), each with its own writer.
+
+# Routing
+# The shard of a user is decided by the hash of its id, so every id always lives in exactly one shard.
+# The hash is Jump Consistent Hash (Lamping and Veach, 2014).
+# When the number of shards changes from N to M, only the ids that must move are moved
+# (about 1/M of them when one shard is added), instead of almost all of them as with id % N.
+
+# Shards
+# Each shard has its own connection and its own single-thread executor,
+# like AsyncUserStore of 013_Sqlite3AsyncAccess.py.
+# The connection is created in that thread and is used only there, as sqlite3 expects.
+# Writes to different shards run in different threads at the same time.
+# While one shard waits for the disk to confirm a commit, the others keep working.
+# A point lookup like show_select_one goes only to the shard of the id.
+# A scan like show_select_all is sent to all shards at once, and the sorted results are merged.
+
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# ====================================================================================================
+
+def jump_hash(key, buckets):
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+class Shard:
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=os.path.basename(path))
+        self._conn = None
+        self.run(self._open).result()
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path)
+        # WAL lets the fan-out reads of other threads see committed data while this shard writes.
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user(
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                email TEXT,
+                regdate TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def run(self, function, *args):
+        return self._executor.submit(function, *args)
+
+    def executemany(self, sql, parameters, batch_size):
+        # Runs in the shard thread. Each batch is one transaction.
+        total = 0
+        parameters = iter(parameters)
+        try:
+            while True:
+                batch = list(islice(parameters, batch_size))
+                if not batch:
+                    return total
+                cur = self._conn.executemany(sql, batch)
+                self._conn.commit()
+                total += cur.rowcount
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def fetchall(self, sql, parameters=()):
+        return self._conn.execute(sql, parameters).fetchall()
+
+    def close(self):
+        self.run(self._conn.close).result()
+        self._executor.shutdown()
+
+# ====================================================================================================
+
+class ShardedUserStore:
+    # The number of shards is saved next to the shards, so the store is never opened with a different count.
+    # A different count would send lookups to the wrong files. Use rebalance() to change it.
+    MANIFEST = "shards.json"
+
+    def __init__(self, directory, shard_count=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)["shard_count"]
+            if shard_count is not None and shard_count != stored:
+                raise ValueError(f"The store has {stored} shards, not {shard_count}. Use rebalance() to change it.")
+            shard_count = stored
+        if not shard_count:
+            raise ValueError("shard_count is required for a new store")
+        self.shards = [Shard(self._shard_path(index)) for index in range(shard_count)]
+        self._save_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _shard_path(self, index):
+        return os.path.join(self.directory, f"user_shard_{index}.db")
+
+    def _save_manifest(self):
+        with open(os.path.join(self.directory, self.MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"shard_count": len(self.shards)}, f)
+
+    def shard_of(self, pk):
+        return jump_hash(pk, len(self.shards))
+
+    def _group(self, items, key):
+        groups = defaultdict(list)
+        for item in items:
+            groups[self.shard_of(key(item))].append(item)
+        return groups
+
+    def _fan_out(self, groups, sql, batch_size):
+        futures = [
+            self.shards[index].run(self.shards[index].executemany, sql, items, batch_size)
+            for index, items in groups.items()
+        ]
+        return sum(future.result() for future in futures)
+
+    # CRUD
+    def insert_many(self, user_list, batch_size=1000):
+        return self._fan_out(self._group(user_list, lambda row: row[0]), """
+            INSERT INTO user (id, name, email, regdate)
+            VALUES (?, ?, ?, ?)
+        """, batch_size)
+
+    def insert(self, pk, name, email, regdate):
+        return self.insert_many([(pk, name, email, regdate)])
+
+    def select_one(self, pk):
+        shard = self.shards[self.shard_of(pk)]
+        rows = shard.run(shard.fetchall, """
+            SELECT id, name, email, regdate
+            FROM user
+            WHERE id = ?
+        """, (pk,)).result()
+        return rows[0] if rows else None
+
+    def select_all(self):
+        # Every shard sorts its own rows by id, and heapq.merge combines the sorted lists.
+        futures = [shard.run(shard.fetchall, """
+            SELECT id, name, email, regdate
+            FROM user
+            ORDER BY id
+        """) for shard in self.shards]
+        return list(heapq.merge(*(future.result() for future in futures)))
+
+    def update_many(self, update_user_list, batch_size=1000):
+        return self._fan_out(self._group(update_user_list, lambda change: change["id"]), """
+            UPDATE user
+            SET name = :name, email = :name || '@example.com'
+            WHERE id = :id
+        """, batch_size)
+
+    def delete(self, pk):
+        return self._fan_out({self.shard_of(pk): [(pk,)]}, """
+            DELETE FROM user
+            WHERE id = ?
+        """, 1)
+
+    def count(self):
+        futures = [shard.run(shard.fetchall, "SELECT count(*) FROM user") for shard in self.shards]
+        return sum(future.result()[0][0] for future in futures)
+
+    # Rebalancing
+    # Writes must be paused while the shards are rebalanced.
+    # A moved row is first written to its new shard and then deleted from the old one.
+    # If the process stops in between, the row exists twice, and running rebalance() again
+    # finishes the move, because INSERT OR REPLACE overwrites the copy that is already there.
+    # Each shard is read one page of batch_size rows at a time, in id order (keyset paging),
+    # so only one page is in memory however large the shard is.
+    def rebalance(self, shard_count, batch_size=10_000):
+        old_count = len(self.shards)
+        for index in range(old_count, shard_count):
+            self.shards.append(Shard(self._shard_path(index)))
+        moved = 0
+        for index in range(old_count):
+            source = self.shards[index]
+            rows = source.run(source.fetchall, """
+                SELECT id, name, email, regdate
+                FROM user
+                ORDER BY id
+                LIMIT ?
+            """, (batch_size,)).result()
+            while rows:
+                moved += self._move_rows(index, rows, shard_count, batch_size)
+                rows = source.run(source.fetchall, """
+                    SELECT id, name, email, regdate
+                    FROM user
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (rows[-1][0], batch_size)).result()
+        for shard in self.shards[shard_count:]:
+            shard.close()
+            os.remove(shard.path)
+        del self.shards[shard_count:]
+        self._save_manifest()
+        return moved
+
+    def _move_rows(self, index, rows, shard_count, batch_size):
+        source = self.shards[index]
+        groups = defaultdict(list)
+        for row in rows:
+            target = jump_hash(row[0], shard_count)
+            if target != index:
+                groups[target].append(row)
+        for target, moving in groups.items():
+            self.shards[target].run(self.shards[target].executemany, """
+                INSERT OR REPLACE INTO user (id, name, email, regdate)
+                VALUES (?, ?, ?, ?)
+            """, moving, batch_size).result()
+            source.run(source.executemany, """
+                DELETE FROM user
+                WHERE id = ?
+            """, [(row[0],) for row in moving], batch_size).result()
+        return sum(len(moving) for moving in groups.values())
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+# ====================================================================================================
+
+# Let's run the steps of 006_Sqlite3BasicUsage.py on 4 shards.
+with tempfile.TemporaryDirectory() as temp_dir:
+    with ShardedUserStore(os.path.join(temp_dir, "029_shards"), 4) as store:
+        store.insert(1, 'Bonita', 'Bonita@example.com', now)
+        store.insert(2, 'Bono', 'Bono@example.com', now)
+        user_list = (
+            (3, 'Belita', 'Belita@example.com', now),
+            (4, 'Charlotte', 'Charlotte@example.com', now),
+            (5, 'Cynthia', 'Cynthia@example.com', now)
+        )
+        store.insert_many(user_list)
+        print("All User List")
+        for row in store.select_all():
+            print(f"shard {store.shard_of(row[0])} : {row}")
+
+        print(f"\nOne User : {store.select_one(2)}")
+        store.update_many([
+            {"name":"Erica", "id":1},
+            {"name":"Frances", "id":2},
+            {"name":"Edith", "id":4},
+        ])
+        store.delete(3)
+        print("\nAfter Update many and Delete")
+        for row in store.select_all():
+            print(f"shard {store.shard_of(row[0])} : {row}")
+
+        store.insert_many((pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(6, 100_001))
+        before = store.select_all()
+        for shard_count in (5, 8, 3):
+            moved = store.rebalance(shard_count)
+            print(f"\nrebalance to {shard_count} shards : {moved} of {store.count()} rows moved")
+        assert store.select_all() == before
+
+    # Reopening with the saved count works, and a wrong count is refused.
+    with ShardedUserStore(os.path.join(temp_dir, "029_shards")) as store:
+        print(f"reopened with {len(store.shards)} shards : {store.select_one(4)}")
+    try:
+        ShardedUserStore(os.path.join(temp_dir, "029_shards"), 4)
+    except ValueError as e:
+        print(e)
+
+result_delimiter()
+
+# ====================================================================================================
+
+# Benchmark
+# Users are inserted in small transactions, as an online service would write them.
+# Each commit waits for the disk (fsync), and that wait is what extra writers overlap.
+# Even on a single CPU, a shard can commit while another one is waiting for the disk.
+# So the gain depends on how slow fsync is. On a disk with a fast write cache there is little to overlap,
+# and building the rows in Python (which holds the GIL) becomes the limit instead.
+BENCHMARK_USER_COUNT = 20_000
+BENCHMARK_BATCH_SIZE = 20
+BENCHMARK_SHARD_COUNTS = (1, 2, 4, 8)
+
+for shard_count in BENCHMARK_SHARD_COUNTS:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with ShardedUserStore(temp_dir, shard_count) as store:
+            rows = [(pk, f"user{pk}", f"user{pk}@example.com", now) for pk in range(1, BENCHMARK_USER_COUNT + 1)]
+            start = time.perf_counter()
+            store.insert_many(rows, batch_size=BENCHMARK_BATCH_SIZE)
+            write = time.perf_counter() - start
+            start = time.perf_counter()
+            assert len(store.select_all()) == BENCHMARK_USER_COUNT
+            scan = time.perf_counter() - start
+        print(f"{shard_count:>2} shards | write {BENCHMARK_USER_COUNT / write:>10,.0f} rows/s "
+              f"({BENCHMARK_USER_COUNT // BENCHMARK_BATCH_SIZE} commits) | scan {scan * 1000:>8.1f} ms")
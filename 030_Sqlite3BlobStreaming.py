@@ -0,0 +1,326 @@
+# 006_Sqlite3BasicUsage.py lists BLOB as one of the sqlite3 types, but it stores only short TEXT columns.
+# An attachment of many MB could be stored as one bytes value,
+# but then the whole value has to be in memory when it is written,
+# and SELECT returns the whole value again when it is read, while the caller waits.
+# In this file, I will make a blob storage on top of the same database that streams in chunks.
+
+# How it is stored
+# A large object is split into chunks of chunk_size bytes, one chunk per row of attachment_chunk.
+# The attachment table keeps the name, the total size and the chunk size.
+# Small rows are cheap to update and delete, and no single value ever gets close to sqlite3's BLOB limit.
+
+# How it is streamed
+# Connection.blobopen opens one BLOB value like a file, with read, write, seek and tell.
+# Writing : when the size is known, each chunk row is created with zeroblob(n), an empty BLOB of n bytes,
+#           and the data is written into it piece by piece while it is read from the source.
+#           So only one small piece is in memory at a time.
+# Reading : open_attachment returns a raw binary stream, like open(path, "rb", buffering=0).
+#           Its readinto fills the caller's buffer, so a loop can reuse one buffer for the whole object.
+#           sqlite3.Blob has no readinto itself, so each call goes through a bytes object
+#           no larger than the caller's buffer. So it is not zero-copy: every byte is copied once more,
+#           but the extra memory stays bounded by the buffer size.
+
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, so the peak RSS is not reported there.
+    resource = None
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+CHUNK_SIZE = 1024 * 1024
+IO_SIZE = 64 * 1024
+
+# ====================================================================================================
+
+def create_blob_tables(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS attachment(
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            name TEXT,
+            size INTEGER,
+            chunk_size INTEGER,
+            regdate TEXT
+        )
+    """)
+    # blobopen needs the rowid of the row, so the chunk table is a rowid table with a separate unique index.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS attachment_chunk(
+            id INTEGER PRIMARY KEY,
+            attachment_id INTEGER,
+            seq INTEGER,
+            data BLOB
+        )
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS attachment_chunk_idx ON attachment_chunk(attachment_id, seq)
+    """)
+    conn.commit()
+
+def stream_size(stream):
+    try:
+        return os.fstat(stream.fileno()).st_size - stream.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+# Writing
+# The whole attachment is written in one transaction, so a half-written attachment is never visible.
+def write_attachment(conn, user_id, name, stream, size=None, chunk_size=CHUNK_SIZE, io_size=IO_SIZE):
+    size = stream_size(stream) if size is None else size
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO attachment (user_id, name, size, chunk_size, regdate)
+            VALUES (?, ?, ?, ?, ?)
+        """, (user_id, name, 0, chunk_size, now))
+        attachment_id = cur.lastrowid
+        if size is not None:
+            total = write_known_size(conn, attachment_id, stream, size, chunk_size, io_size)
+        else:
+            total = write_unknown_size(conn, attachment_id, stream, chunk_size)
+        cur.execute("""
+            UPDATE attachment
+            SET size = ?
+            WHERE id = ?
+        """, (total, attachment_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return attachment_id
+
+def write_known_size(conn, attachment_id, stream, size, chunk_size, io_size):
+    buffer = bytearray(io_size)
+    view = memoryview(buffer)
+    total = 0
+    for seq, offset in enumerate(range(0, size, chunk_size)):
+        length = min(chunk_size, size - offset)
+        cur = conn.execute("""
+            INSERT INTO attachment_chunk (attachment_id, seq, data)
+            VALUES (?, ?, zeroblob(?))
+        """, (attachment_id, seq, length))
+        with conn.blobopen("attachment_chunk", "data", cur.lastrowid) as blob:
+            written = 0
+            while written < length:
+                count = stream.readinto(view[:min(io_size, length - written)])
+                if not count:
+                    raise EOFError(f"The stream ended after {total + written} of {size} bytes")
+                blob.write(view[:count])
+                written += count
+        total += length
+    return total
+
+# A stream without a known size (a pipe, a socket) is read one chunk at a time instead.
+def write_unknown_size(conn, attachment_id, stream, chunk_size):
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+    seq = 0
+    while True:
+        filled = 0
+        while filled < chunk_size:
+            count = stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        if not filled:
+            return total
+        conn.execute("""
+            INSERT INTO attachment_chunk (attachment_id, seq, data)
+            VALUES (?, ?, ?)
+        """, (attachment_id, seq, view[:filled]))
+        total += filled
+        seq += 1
+        if filled < chunk_size:
+            return total
+
+def delete_attachment(conn, attachment_id):
+    conn.execute("DELETE FROM attachment_chunk WHERE attachment_id = ?", (attachment_id,))
+    conn.execute("DELETE FROM attachment WHERE id = ?", (attachment_id,))
+    conn.commit()
+
+# ====================================================================================================
+
+# Reading
+class AttachmentReader(io.RawIOBase):
+    def __init__(self, conn, attachment_id):
+        self._conn = conn
+        row = conn.execute("""
+            SELECT size, chunk_size
+            FROM attachment
+            WHERE id = ?
+        """, (attachment_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No attachment with id {attachment_id}")
+        self.size, self.chunk_size = row
+        self._chunk_rowids = [rowid for rowid, in conn.execute("""
+            SELECT id
+            FROM attachment_chunk
+            WHERE attachment_id = ?
+            ORDER BY seq
+        """, (attachment_id,))]
+        self._position = 0
+        self._blob = None
+        self._blob_index = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view) and self._position < self.size:
+            index, offset = divmod(self._position, self.chunk_size)
+            # If the stored size is larger than the chunks really are, the read ends where the data ends.
+            if index >= len(self._chunk_rowids):
+                break
+            if index != self._blob_index:
+                if self._blob is not None:
+                    self._blob.close()
+                self._blob = self._conn.blobopen("attachment_chunk", "data", self._chunk_rowids[index], readonly=True)
+                self._blob_index = index
+            available = len(self._blob) - offset
+            if available <= 0:
+                break
+            self._blob.seek(offset)
+            data = self._blob.read(min(len(view) - filled, available))
+            view[filled:filled + len(data)] = data
+            filled += len(data)
+            self._position += len(data)
+        return filled
+
+    def close(self):
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+        super().close()
+
+def open_attachment(conn, attachment_id):
+    return AttachmentReader(conn, attachment_id)
+
+# ====================================================================================================
+
+# Benchmark
+# Each case runs in its own process, so that its peak RSS (the most memory the process ever used)
+# is not hidden by the peak of an earlier case.
+# The attachment is stored once as a single BLOB value, and once in chunks by write_attachment.
+# "whole" reads and writes it as one bytes value, and "stream" goes through this file's API.
+BENCHMARK_SIZE = 64 * 1024 * 1024
+
+def peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_case(case, database, source, output):
+    conn = sqlite3.connect(database)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    if case == "write whole":
+        with open(source, "rb") as f:
+            data = f.read()
+        conn.execute("INSERT OR REPLACE INTO whole_attachment (id, data) VALUES (1, ?)", (data,))
+        conn.commit()
+    elif case == "write stream":
+        with open(source, "rb") as f:
+            write_attachment(conn, 1, "benchmark.bin", f)
+    elif case == "read whole":
+        data = conn.execute("SELECT data FROM whole_attachment WHERE id = 1").fetchone()[0]
+        with open(output, "wb") as f:
+            f.write(data)
+    elif case == "read stream":
+        attachment_id = conn.execute("SELECT max(id) FROM attachment").fetchone()[0]
+        buffer = bytearray(CHUNK_SIZE)
+        with open_attachment(conn, attachment_id) as reader, open(output, "wb") as f:
+            while count := reader.readinto(buffer):
+                f.write(memoryview(buffer)[:count])
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, peak_rss_mb() - rss_before
+
+if __name__ == "__main__":
+    # Let's attach a file to a user of 006_Sqlite3BasicUsage.py and read it back in pieces.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        conn = sqlite3.connect(os.path.join(temp_dir, "030_database.db"))
+        create_blob_tables(conn)
+        payload = random.Random(30).randbytes(2_500_000)
+        source = os.path.join(temp_dir, "Bonita.bin")
+        with open(source, "wb") as f:
+            f.write(payload)
+        with open(source, "rb") as f:
+            attachment_id = write_attachment(conn, 1, "Bonita.bin", f, chunk_size=CHUNK_SIZE)
+        # A stream with no size, like a pipe, takes the other path.
+        unknown_id = write_attachment(conn, 1, "pipe.bin", io.BytesIO(payload), size=None)
+        print(conn.execute("SELECT id, user_id, name, size, chunk_size FROM attachment").fetchall())
+        print(conn.execute("""
+            SELECT attachment_id, seq, length(data)
+            FROM attachment_chunk
+            WHERE attachment_id = ?
+        """, (attachment_id,)).fetchall())
+
+        with open_attachment(conn, attachment_id) as reader:
+            reader.seek(CHUNK_SIZE - 5)
+            print(f"10 bytes across the chunk border : {reader.read(10).hex()}")
+            assert reader.tell() == CHUNK_SIZE + 5
+            reader.seek(0)
+            buffered = io.BufferedReader(reader, buffer_size=IO_SIZE)
+            assert buffered.read() == payload
+        with open_attachment(conn, unknown_id) as reader:
+            assert reader.readall() == payload
+        delete_attachment(conn, unknown_id)
+        print(f"attachments after delete : {conn.execute('SELECT count(*) FROM attachment').fetchone()[0]}")
+        conn.close()
+
+    result_delimiter()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = os.path.join(temp_dir, "030_benchmark.db")
+        source = os.path.join(temp_dir, "source.bin")
+        output = os.path.join(temp_dir, "output.bin")
+        conn = sqlite3.connect(database)
+        create_blob_tables(conn)
+        conn.execute("CREATE TABLE whole_attachment(id INTEGER PRIMARY KEY, data BLOB)")
+        conn.commit()
+        conn.close()
+        with open(source, "wb") as f:
+            block = random.Random(30).randbytes(1024 * 1024)
+            for _ in range(BENCHMARK_SIZE // len(block)):
+                f.write(block)
+
+        for case in ("write whole", "write stream", "read whole", "read stream"):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                elapsed, rss = executor.submit(run_case, case, database, source, output).result()
+            if case.startswith("read"):
+                with open(source, "rb") as expected, open(output, "rb") as actual:
+                    assert expected.read() == actual.read()
+            print(f"{case:<14} {BENCHMARK_SIZE / 1024 / 1024 / elapsed:>10.1f} MB/s   peak RSS +{rss:>7.1f} MB")
@@ -0,0 +1,275 @@
+# 005_AboutOpenFunction.py documents the errors parameter (strict, ignore, replace, surrogateescape,
+# xmlcharrefreplace, backslashreplace, namereplace) and the newline translation of text files.
+# The dumps we receive are dirty: some are UTF-8, some are CP949 or Latin-1,
+# some have \r\n or \r line endings, and some have a few broken bytes.
+# Before ingestion, all of them have to become UTF-8 with \n line endings.
+# In this file, I will make a streaming transcoder that does it in one pass per file.
+
+# The steps
+# 1. Detection : a sample from the start of the file is decoded with each candidate encoding.
+#    A BOM decides it immediately. Otherwise, the first candidate with no errors wins.
+#    UTF-8 alone may have a few broken bytes, but only if valid multibyte characters were seen too,
+#    because a Latin-1 or CP949 text almost never forms valid UTF-8 by chance.
+# 2. Decoding : the file is read in large chunks with an incremental decoder,
+#    which keeps a multibyte character that is cut at the end of a chunk until the next chunk arrives.
+#    The errors policy decides what happens to bytes that cannot be decoded, and they are counted.
+# 3. Newlines : IncrementalNewlineDecoder turns \r\n and \r into \n, as newline=None does in open().
+#    A \r at the end of a chunk is kept until it is known whether \n follows.
+# 4. Encoding : the text is encoded to the target encoding (UTF-8) and written to a temporary file,
+#    which replaces the destination only when everything went well.
+# Many files are transcoded at the same time with a process pool, as in 018_ParallelFileProcessing.py.
+
+import codecs
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+def get_path(*args):
+    return os.path.join(BASE_DIR, *args)
+def result_delimiter():
+    print(f"\n{'=' * 100}\n")
+
+CHUNK_SIZE = 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+# The candidates are tried in order, so the most likely encodings come first.
+# latin-1 can decode any byte, so it is the last resort.
+DEFAULT_CANDIDATES = ("utf-8", "cp949", "latin-1")
+MAX_ERROR_RATIO = 0.001
+
+# xmlcharrefreplace and namereplace work only when writing, as 005_AboutOpenFunction.py says,
+# so they are accepted for encode_errors but not for errors.
+DECODE_ERRORS = ("strict", "ignore", "replace", "backslashreplace", "surrogateescape")
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# ====================================================================================================
+
+# Counting errors
+# Each policy is wrapped by a handler that counts how many bad bytes it saw, and then does the same as the policy.
+# Error handlers are registered by name for the whole process, so they cannot hold the count themselves.
+# Instead, counting_errors() gives each call its own counter, kept per thread,
+# so transcode can run in several threads at the same time and every call gets its own count.
+_current = threading.local()
+
+@contextmanager
+def counting_errors():
+    counter = [0]
+    previous = getattr(_current, "counter", None)
+    _current.counter = counter
+    try:
+        yield counter
+    finally:
+        _current.counter = previous
+
+def register_counting_handler(policy):
+    name = f"counting_{policy}"
+    handler = codecs.lookup_error(policy)
+
+    def counting_handler(error):
+        counter = getattr(_current, "counter", None)
+        if counter is not None:
+            counter[0] += error.end - error.start
+        return handler(error)
+
+    codecs.register_error(name, counting_handler)
+    return name
+
+COUNTING_HANDLERS = {policy: register_counting_handler(policy) for policy in DECODE_ERRORS}
+
+# ====================================================================================================
+
+# Detection
+def detect_encoding(sample, candidates=DEFAULT_CANDIDATES, max_error_ratio=MAX_ERROR_RATIO):
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    for encoding in candidates[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)(errors=COUNTING_HANDLERS["replace"])
+        with counting_errors() as bad_bytes:
+            # final=False, because the sample may end in the middle of a character.
+            text = decoder.decode(sample, final=False)
+        if not bad_bytes[0]:
+            return encoding
+        if codecs.lookup(encoding).name == "utf-8" and bad_bytes[0] <= len(sample) * max_error_ratio:
+            multibyte = sum(1 for char in text if char > "\x7f" and char != "\ufffd")
+            if multibyte:
+                return encoding
+    return candidates[-1]
+
+# Transcoding
+def transcode(source, destination, encoding=None, errors="replace", newline="\n",
+              target_encoding="utf-8", encode_errors="strict", chunk_size=CHUNK_SIZE,
+              candidates=DEFAULT_CANDIDATES):
+    if errors not in COUNTING_HANDLERS:
+        raise ValueError(f"errors must be one of {DECODE_ERRORS} when decoding, not {errors!r}")
+    if errors == "surrogateescape" and encode_errors == "strict":
+        # The escaped bytes can only be written back as they were.
+        encode_errors = "surrogateescape"
+    start = time.perf_counter()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    bytes_in = bytes_out = 0
+    directory = os.path.dirname(os.path.abspath(destination))
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        # The temporary descriptor is wrapped first, so it is closed even if the source cannot be opened.
+        with open(temp_fd, "wb", buffering=0) as fout, open(source, "rb", buffering=0) as fin, \
+                counting_errors() as bad_bytes:
+            read_size = fin.readinto(buffer)
+            if encoding is None:
+                encoding = detect_encoding(bytes(view[:min(read_size, SAMPLE_SIZE)]), candidates)
+            decoder = codecs.getincrementaldecoder(encoding)(errors=COUNTING_HANDLERS[errors])
+            decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+            encoder = codecs.getincrementalencoder(target_encoding)(errors=encode_errors)
+            while read_size:
+                bytes_in += read_size
+                text = decoder.decode(view[:read_size])
+                if newline != "\n":
+                    text = text.replace("\n", newline)
+                bytes_out += fout.write(encoder.encode(text))
+                read_size = fin.readinto(buffer)
+            text = decoder.decode(b"", final=True)
+            if newline != "\n":
+                text = text.replace("\n", newline)
+            bytes_out += fout.write(encoder.encode(text, final=True))
+        os.replace(temp_path, destination)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return {
+        "source": source,
+        "encoding": encoding,
+        "bad_bytes": bad_bytes[0],
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "seconds": time.perf_counter() - start,
+    }
+
+# Parallel
+# The worker is a top-level function so that it can be pickled.
+def transcode_job(job):
+    source, destination, options = job
+    return transcode(source, destination, **options)
+
+def transcode_files(sources, output_dir, max_workers=None, **options):
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(source, os.path.join(output_dir, os.path.basename(source)), options) for source in sources]
+    if max_workers == 1:
+        return [transcode_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(transcode_job, jobs))
+
+# ====================================================================================================
+
+# Benchmark
+# Dirty dumps are generated in three encodings with mixed line endings and a few broken bytes.
+# The naive loop is the usual way : open(..., encoding=...) and write line by line.
+# It is given the right encoding for free, while the transcoder has to detect it.
+# Decoding is CPU work, so the parallel run gains only when the machine has more than one CPU.
+BENCHMARK_FILE_SIZE = 16 * 1024 * 1024
+BENCHMARK_LINES = (
+    "Bonita,Bonita@example.com,2020-07-07 12:00:00",
+    "Charlotte,Charlotte@example.com,café résumé",
+    "안녕하세요,hello@example.com,사용자 목록",
+)
+
+def make_dirty_file(path, encoding, size, seed):
+    generator = random.Random(seed)
+    block = bytearray()
+    while len(block) < 1024 * 1024:
+        line = generator.choice(BENCHMARK_LINES).encode(encoding, errors="replace")
+        block += line + generator.choice((b"\n", b"\r\n", b"\r\n", b"\r"))
+        if encoding == "utf-8" and generator.random() < 0.001:
+            # Broken bytes, as from a UTF-8 dump cut in the middle of characters.
+            # The other encodings must decode cleanly to be detected, so they get none.
+            block += b"\xff\xfe\xff"
+    with open(path, "wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+
+def naive_transcode(source, destination, encoding, errors="replace"):
+    with open(source, "r", encoding=encoding, errors=errors, newline=None) as fin, \
+            open(destination, "w", encoding="utf-8", newline="\n") as fout:
+        for line in fin:
+            fout.write(line)
+
+if __name__ == "__main__":
+    # Let's transcode a CP949 text with \r\n, a UTF-8 text with a BOM and a broken byte, and Latin-1 texts.
+    # Only the last 48 bytes of each result are printed.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        samples = {
+            "cp949.txt": "이름,이메일\r\n보니타,Bonita@example.com\r\n".encode("cp949"),
+            "utf8_bom.txt": codecs.BOM_UTF8 + b"Bono,Bono@example.com\rBroken,\xff\n",
+            "latin1.txt": "Belita,café\r\nCharlotte,naïve\r\n".encode("latin-1"),
+            # Mostly ASCII. One é in Latin-1 is enough to rule out UTF-8.
+            "latin1_ascii.txt": b"Bonita,Bonita@example.com\r\n" * 1200 + "Belita,café\r\n".encode("latin-1"),
+        }
+        sources = []
+        for name, data in samples.items():
+            path = os.path.join(temp_dir, name)
+            with open(path, "wb") as f:
+                f.write(data)
+            sources.append(path)
+        for report in transcode_files(sources, os.path.join(temp_dir, "out"), max_workers=1):
+            with open(os.path.join(temp_dir, "out", os.path.basename(report["source"])), "rb") as f:
+                print(f"{os.path.basename(report['source']):<18} {report['encoding']:<10} "
+                      f"bad bytes {report['bad_bytes']} -> {f.read()[-48:]!r}")
+
+        # The same broken byte under each errors policy.
+        print()
+        for policy in DECODE_ERRORS[1:]:
+            transcode(sources[1], os.path.join(temp_dir, "policy.txt"), errors=policy)
+            with open(os.path.join(temp_dir, "policy.txt"), "rb") as f:
+                print(f"{policy:<18} {f.read()!r}")
+        try:
+            transcode(sources[1], os.path.join(temp_dir, "policy.txt"), errors="strict")
+        except UnicodeDecodeError as e:
+            print(f"{'strict':<18} {e}")
+
+    result_delimiter()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sources = []
+        for index, encoding in enumerate(("utf-8", "cp949", "latin-1") * 2):
+            path = os.path.join(temp_dir, f"dump_{index}_{encoding}.txt")
+            make_dirty_file(path, encoding, BENCHMARK_FILE_SIZE, index)
+            sources.append(path)
+        total_mb = sum(os.path.getsize(path) for path in sources) / 1024 / 1024
+
+        start = time.perf_counter()
+        for path in sources:
+            naive_transcode(path, os.path.join(temp_dir, "naive_" + os.path.basename(path)),
+                            path.rsplit("_", 1)[1][:-4])
+        naive = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reports = transcode_files(sources, os.path.join(temp_dir, "single"), max_workers=1)
+        single = time.perf_counter() - start
+        assert [report["encoding"] for report in reports] == [path.rsplit("_", 1)[1][:-4] for path in sources]
+
+        start = time.perf_counter()
+        transcode_files(sources, os.path.join(temp_dir, "parallel"))
+        parallel = time.perf_counter() - start
+
+        for path in sources:
+            name = os.path.basename(path)
+            with open(os.path.join(temp_dir, "naive_" + name), "rb") as f:
+                expected = f.read()
+            for directory in ("single", "parallel"):
+                with open(os.path.join(temp_dir, directory, name), "rb") as f:
+                    assert f.read() == expected
+
+        print(f"{len(sources)} files, {total_mb:.0f} MB, {os.cpu_count()} CPUs")
+        for name, elapsed in (("naive line loop", naive), ("transcode", single), ("transcode parallel", parallel)):
+            print(f"{name:<20} {total_mb / elapsed:>10.1f} MB/s")